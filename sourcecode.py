@@ -1,14 +1,29 @@
+import aiohttp
 import discord
 from discord import app_commands
 from discord.ext import commands, tasks
 import asyncio
+import functools
+import heapq
+import itertools
+import io
 import time
 import uuid
 import os
-import json
+import mmap
+import orjson
 from datetime import datetime, timezone, timedelta
-import math
 import random
+import signal
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from itertools import accumulate, chain, groupby
+from dataclasses import dataclass, field
+
+try:
+    import uvloop  # optional: faster libuv event loop where available
+except ImportError:
+    uvloop = None
 
 # -----------------------------
 # CONFIG
@@ -17,15 +32,46 @@ import random
 TOKEN = os.getenv("TOKEN_ID", "")
 GUILD_TOKEN = os.getenv("GUILD_ID", "")
 intents = discord.Intents.default()
-bot = commands.Bot(command_prefix="!", intents=intents)
-save_lock = asyncio.Lock()
+
+class PixelHeroesBot(commands.Bot):
+    flush_task: asyncio.Task | None = None  # set in setup_hook, which a failed login never reaches
+
+    async def login(self, token):
+        # discord.py builds TCPConnector(limit=0) when none is set; this keeps its pooling but holds
+        # idle sockets open across the gaps between slots frames and caches API DNS lookups
+        self.http.connector = aiohttp.TCPConnector(limit=0, keepalive_timeout=60, ttl_dns_cache=300)
+        await super().login(token)
+
+    async def setup_hook(self):
+        self.flush_task = asyncio.create_task(flush_loop())
+        # Expiry sweeps; each pass queues one batched save for everything it touched
+        auction_cleanup.start()
+        coinflip_cleanup.start()
+        # Players and indexes are loaded at import; sprite bytes are the only lazily read data left
+        self.sprite_warmup = asyncio.create_task(asyncio.to_thread(warm_sprite_cache))
+
+        # Route SIGTERM through close() so queued saves are flushed before exit
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(self.close()))
+        except NotImplementedError:  # not supported by the Windows event loop
+            pass
+
+    async def close(self):
+        # Waits out a flush_loop pass already writing, then writes whatever is still dirty
+        await flush_pending_saves()
+        if self.flush_task:
+            self.flush_task.cancel()
+        await super().close()
+
+bot = PixelHeroesBot(command_prefix="!", intents=intents)
 
 # -----------------------------
 # DATABASES / FILES
 # -----------------------------
 
 DATA_DIR = "assets"
-PLAYER_FILE = os.path.join(DATA_DIR, "players.json")
+PLAYER_FILE = os.path.join(DATA_DIR, "players.json")  # legacy single-file store, imported once
+PLAYER_DIR = os.path.join(DATA_DIR, "players")
 HEROES_FILE = os.path.join(DATA_DIR, "heroes.json")
 MONSTERS_FILE = os.path.join(DATA_DIR, "monsters.json")
 ITEMS_FILE = os.path.join(DATA_DIR, "items.json")
@@ -35,32 +81,302 @@ CONTRACT_EMOJI = "📜"
 
 def load_json(path, default_obj=None):
     if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
     return default_obj if default_obj is not None else {}
 
-async def save_json(path, data):
-    async with save_lock:
-        tmp = f"{path}.tmp"
-        with open(tmp, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
-        os.replace(tmp, path)
-
-players = load_json(PLAYER_FILE, {})
-heroes_db = load_json(HEROES_FILE, [])
-monsters_db = load_json(MONSTERS_FILE, [])
+def load_json_ro(path, default_obj=None):
+    """Parse a read-only data file straight from an mmap, skipping the read() copy."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:  # mmap rejects empty files
+        return load_json(path, default_obj)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+        return orjson.loads(view)
+
+def _dump_sync(path, data, indent=True):
+    tmp = f"{path}.tmp"
+    option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+    with open(tmp, "wb") as f:
+        f.write(orjson.dumps(data, option=option))
+    os.replace(tmp, path)
+
+_save_locks: dict[str, asyncio.Lock] = {}
+
+async def save_json(path, data, indent=True):
+    # Writers of the same file share a .tmp path, so only they need to queue behind each other
+    lock = _save_locks.get(path)
+    if lock is None:
+        lock = _save_locks[path] = asyncio.Lock()
+    async with lock:
+        # File I/O runs in a worker thread so the event loop keeps serving heartbeats and interactions
+        await asyncio.to_thread(_dump_sync, path, data, indent)
+
+def player_path(user_id):
+    return os.path.join(PLAYER_DIR, f"{user_id}.json")
+
+# In-memory indexes kept on player records; stripped before a record is written
+TRANSIENT_KEYS = frozenset({"_pc_index", "_ids_sorted"})
+
+class Bag(Counter):
+    """A Counter whose item lookups ignore case; each item keeps the spelling it was first stored with.
+
+    Missing items read as 0, and orjson writes a Bag as a plain object under the stored spellings.
+    """
+
+    def __init__(self, items=None, /, **kwds):
+        self._keys = {}  # lowercased name -> stored spelling
+        super().__init__(items, **kwds)
+
+    def update(self, items=None, /, **kwds):
+        # Counter.update fills an empty counter through dict.update, which would bypass _keys
+        if items is not None:
+            if hasattr(items, "keys"):
+                for name in items.keys():
+                    self[name] += items[name]
+            else:  # an iterable of item names, counted one each
+                for name in items:
+                    self[name] += 1
+        for name, amount in kwds.items():
+            self[name] += amount
+
+    def __getitem__(self, name):
+        return super().__getitem__(self._keys.get(name.lower(), name))
+
+    def __setitem__(self, name, amount):
+        super().__setitem__(self._keys.setdefault(name.lower(), name), amount)
+
+    def __delitem__(self, name):
+        # Like Counter, deleting a missing item is a no-op
+        key = self._keys.pop(name.lower(), None)
+        if key is not None:
+            dict.__delitem__(self, key)
+
+    def __contains__(self, name):
+        return name.lower() in self._keys
+
+    def get(self, name, default=None):
+        return super().get(self._keys.get(name.lower(), name), default)
+
+    # The remaining dict mutators would otherwise bypass _keys and leave it out of step with the items
+
+    def pop(self, name, *default):
+        key = self._keys.pop(name.lower(), None)
+        if key is None:
+            if default:
+                return default[0]
+            raise KeyError(name)
+        return dict.pop(self, key)
+
+    def popitem(self):
+        key, amount = super().popitem()
+        del self._keys[key.lower()]
+        return key, amount
+
+    def setdefault(self, name, default=None):
+        if name not in self:
+            self[name] = default
+        return self[name]
+
+    def clear(self):
+        super().clear()
+        self._keys.clear()
+
+    def stored_name(self, name):
+        """The spelling ``name`` is stored under, or None if the bag doesn't hold it."""
+        return self._keys.get(name.lower())
+
+def prepare_player(p):
+    """Attach the in-memory indexes to a freshly loaded or created player record."""
+    p["_pc_index"] = {h["unique_id"]: h for h in p.get("pc", [])}
+    # (lowercased id, id) pairs in sorted order, for prefix lookups by find_hero
+    p["_ids_sorted"] = sorted((uid.lower(), uid) for uid in p["_pc_index"])
+    p["bag"] = Bag(p.get("bag", {}))
+    # Boss cooldowns are epoch seconds of the last fight; older records stored ISO strings
+    cooldowns = p.setdefault("boss_cooldowns", {})
+    for btype, last in cooldowns.items():
+        if isinstance(last, str):
+            cooldowns[btype] = datetime.fromisoformat(last).timestamp()
+
+def player_record(p):
+    return {k: v for k, v in p.items() if k not in TRANSIENT_KEYS}
+
+def add_hero(p, hero):
+    p["pc"].append(hero)
+    p["_pc_index"][hero["unique_id"]] = hero
+    insort(p["_ids_sorted"], (hero["unique_id"].lower(), hero["unique_id"]))
+
+def find_hero(p, prefix):
+    """The hero whose unique_id starts with prefix (ignoring case), or None; the lowest id wins a tie."""
+    prefix = prefix.lower()
+    ids = p["_ids_sorted"]
+    i = bisect_left(ids, (prefix,))
+    if i < len(ids) and ids[i][0].startswith(prefix):
+        return p["_pc_index"][ids[i][1]]
+    return None
+
+def load_players():
+    """Load one file per player from PLAYER_DIR, splitting the legacy PLAYER_FILE on first run."""
+    if not os.path.isdir(PLAYER_DIR):
+        legacy = load_json(PLAYER_FILE, {})
+        # Write into a scratch dir and rename it so a crash mid-import is retried next start
+        staging = f"{PLAYER_DIR}.tmp"
+        os.makedirs(staging, exist_ok=True)
+        for uid, p in legacy.items():
+            _dump_sync(os.path.join(staging, f"{uid}.json"), p, indent=False)
+        os.rename(staging, PLAYER_DIR)
+        loaded = legacy
+    else:
+        loaded = {}
+        for entry in os.scandir(PLAYER_DIR):
+            if entry.name.endswith(".json"):
+                loaded[entry.name[:-len(".json")]] = load_json(entry.path)
+
+    for p in loaded.values():
+        prepare_player(p)
+    return loaded
+
+players = load_players()
+heroes_db = load_json_ro(HEROES_FILE, [])
+monsters_db = load_json_ro(MONSTERS_FILE, [])
 auctions = load_json(AUCTION_FILE, {})
-ITEMS = load_json(ITEMS_FILE, {})
+ITEMS = load_json_ro(ITEMS_FILE, {})
 CONSUMABLES = {i["name"].lower(): i for i in ITEMS["consumables"]}
 KEYS = {i["name"].lower(): i for i in ITEMS["keys"]}
 MATERIALS = {
     elem: {r: [m for m in mats] for r, mats in rarities.items()}
     for elem, rarities in ITEMS["materials"].items()
 }
+# Battle drops look elements up case-insensitively; enemies without one use the first table
+MATERIALS_LC = {str(k).lower(): v for k, v in MATERIALS.items()}
+FALLBACK_ELEMENT = next(iter(MATERIALS_LC), None)
+# /sell and /sellall price materials; flattened once, in catalogue order
+SELLABLE_ITEMS = tuple((d["name"].lower(), d) for rarities in MATERIALS.values() for mats in rarities.values() for d in mats)
+# Built in reverse so duplicate names resolve to the first entry, as a linear scan would
+SELLABLE_BY_NAME = {name: d for name, d in reversed(SELLABLE_ITEMS)}
+
+# /bag reads the catalog by exact item name and picks up edits to items.json without a restart
+_items_cache = {"mtime": None}
+
+def get_items():
+    """/bag's view of items.json, re-parsed only when the file's mtime changes."""
+    try:
+        mtime = os.stat(ITEMS_FILE).st_mtime_ns
+    except OSError:
+        mtime = None
+    if "keys" not in _items_cache or _items_cache["mtime"] != mtime:
+        data = load_json(ITEMS_FILE, {})
+        consumables = {i["name"]: i for i in data["consumables"]}
+        keys = {i["name"]: i for i in data["keys"]}
+        # name -> (section, detail); materials carry their catalogue position so /bag keeps its order
+        index = {}
+        for name, meta in keys.items():
+            index.setdefault(name, ("key", meta))
+        for name, meta in consumables.items():
+            index.setdefault(name, ("cons", meta))
+        pos = 0
+        for element, rarities in data["materials"].items():
+            for rarity, mats in rarities.items():
+                for m in mats:
+                    index.setdefault(m["name"], ("material", (pos, element, rarity)))
+                    pos += 1
+        _items_cache.update(
+            mtime=mtime,
+            consumables=consumables,
+            keys=keys,
+            materials=data["materials"],
+            index=index,
+        )
+    return _items_cache
+
+def preparse_skills(templates):
+    """Parse the string power/acc. fields of template skills once, into _power/_acc ints."""
+    for t in templates:
+        for sk in t.get("skills", []):
+            sk["_power"] = int(sk["power"]) if str(sk["power"]).isdigit() else 0
+            sk["_acc"] = int(sk["acc."]) if str(sk["acc."]).isdigit() else 100
+
+preparse_skills(heroes_db)
+preparse_skills(monsters_db)
 
 hero_by_id = {h.get("id"): h for h in heroes_db}
+# Built in reverse so duplicate names resolve to the first entry, as a linear scan would
+hero_by_name = {h["name"].lower(): h for h in reversed(heroes_db)}
 monster_by_id = {m.get("id"): m for m in monsters_db}
 
+def index_monster_types(templates):
+    """Boss pools keyed by lowercased monster type, so /boss doesn't re-lowercase every monster's types per call."""
+    by_type = {}
+    for m in templates:
+        for t in {t.lower() for t in m.get("types", [])}:
+            by_type.setdefault(t, []).append(m)
+    return by_type
+
+MONSTERS_BY_TYPE = index_monster_types(monsters_db)
+
+# -----------------------------
+# DEBOUNCED SAVES
+# -----------------------------
+
+# Handlers mark players/files dirty; flush_loop writes them shortly after, once per burst
+FLUSH_DELAY = 0.5  # seconds a burst of changes is given to coalesce
+
+dirty_players: set[str] = set()
+dirty_files: set[str] = set()
+persisted_files = {AUCTION_FILE: auctions}
+_flush_event = asyncio.Event()
+_flush_lock = asyncio.Lock()  # one flush pass at a time, so close() can't overtake flush_loop
+
+def mark_player_dirty(*user_ids):
+    dirty_players.update(user_ids)
+    _flush_event.set()
+
+def mark_dirty(path):
+    dirty_files.add(path)
+    _flush_event.set()
+
+async def save_player(user_id):
+    # Player files are the hot write path and never hand-edited, so skip the indentation
+    await save_json(player_path(user_id), player_record(players[user_id]), indent=False)
+
+async def flush_player(user_id):
+    """Write one player now rather than on the next debounce tick."""
+    dirty_players.discard(user_id)
+    try:
+        await save_player(user_id)
+    except Exception:
+        mark_player_dirty(user_id)  # leave it to flush_loop to retry
+        raise
+
+async def flush_pending_saves():
+    # Entries leave their dirty set before the write, so a change made while it runs re-marks them;
+    # a failed write puts its entry back for the next pass instead of dropping it
+    async with _flush_lock:
+        for uid in list(dirty_players):
+            dirty_players.discard(uid)
+            if uid not in players:
+                continue
+            try:
+                await save_player(uid)
+            except Exception as e:
+                print(f"❌ Save error for player {uid}: {e}")
+                mark_player_dirty(uid)
+        for path in list(dirty_files):
+            dirty_files.discard(path)
+            try:
+                await save_json(path, persisted_files[path])
+            except Exception as e:
+                print(f"❌ Save error for {path}: {e}")
+                mark_dirty(path)
+
+async def flush_loop():
+    while True:
+        await _flush_event.wait()
+        await asyncio.sleep(FLUSH_DELAY)
+        _flush_event.clear()
+        try:
+            await flush_pending_saves()
+        except Exception as e:
+            print(f"❌ Save error: {e}")
+
 # -----------------------------
 # COLORS / RARITY
 # -----------------------------
@@ -74,6 +390,16 @@ rarity_colors = {
     "mythical": discord.Color.red(),
 }
 
+# (display label, embed colour) per rarity for encounter embeds
+RARITY_META = {r: (r.capitalize(), color) for r, color in rarity_colors.items()}
+
+# Embed colours shared by the recruit and battle screens, which re-render on every click
+COLOR_RED = discord.Color.red()
+COLOR_GREEN = discord.Color.green()
+COLOR_ORANGE = discord.Color.orange()
+COLOR_BLURPLE = discord.Color.blurple()
+COLOR_GOLD = discord.Color.gold()
+
 rarity_order = {
     "legendary": 5,
     "epic": 4,
@@ -82,6 +408,14 @@ rarity_order = {
     "common": 1
 }
 
+RARITIES = ("common", "uncommon", "rare", "epic", "legendary")
+RARITY_IDX = {r: i for i, r in enumerate(RARITIES)}
+
+# KO reward ranges by RARITY_IDX; the trailing entry is the fallback for an unknown rarity (index -1)
+KO_COIN_RANGES = ((50, 100), (150, 250), (250, 500), (500, 1000), (1000, 5000), (100, 200))
+KO_HERO_XP_RANGES = ((200, 1500), (1500, 3000), (3000, 6000), (6000, 12000), (15000, 30000), (5, 10))
+KO_TRAINER_XP_RANGES = ((20, 40), (40, 80), (80, 160), (160, 300), (1000, 2000), (5, 10))
+
 LEGENDARY_DROPS = {
     "Aurelia": [  # Light legendary
         {"name": "Relic of Radiant Souls", "price": None, "special": "AureliaSummon"}
@@ -100,6 +434,14 @@ LEGENDARY_DROPS = {
     ]
 }
 
+# Lowercased relic names → owner, for /use (empty relics) and /summon (filled ones)
+RELIC_TO_HERO = {
+    d["name"].lower(): (hero_name, d) for hero_name, drops in LEGENDARY_DROPS.items() for d in drops
+}
+FILLED_RELIC_TO_HERO = {
+    f"filled {d['name'].lower()}": hero_name for hero_name, drops in LEGENDARY_DROPS.items() for d in drops
+}
+
 BINGO_DURATION = 7200    # 2 hour
 BINGO_COOLDOWN = 14400   # 4 hours
 HUNT_DURATION = 7200    # 2 hour
@@ -118,44 +460,145 @@ async def on_ready():
     except Exception as e:
         print(f"❌ Sync error: {e}")
 
+@bot.listen()
+async def on_interaction(interaction: discord.Interaction):
+    """Keep each player's stored names current so listings don't need fetch_user."""
+    p = players.get(str(interaction.user.id))
+    if not p:
+        return
+    user = interaction.user
+    # The account-wide name, as User.display_name gives it; a Member's display_name is their server nick
+    display_name = user.global_name or user.name
+    if p.get("username") != user.name or p.get("display_name") != display_name:
+        p["username"] = user.name
+        p["display_name"] = display_name
+        mark_player_dirty(str(user.id))
+
+# -----------------------------
+# SPRITES
+# -----------------------------
+
+SPRITE_DIRS = ("heroes", "monsters", "chests")
+
+def scan_sprites():
+    """Normalised paths of every file in the sprite folders; sprites are never added at runtime."""
+    found = set()
+    for sub in SPRITE_DIRS:
+        folder = os.path.join(DATA_DIR, sub)
+        if not os.path.isdir(folder):
+            continue
+        with os.scandir(folder) as entries:
+            found.update(os.path.normpath(e.path) for e in entries if e.is_file())
+    return frozenset(found)
+
+# One directory walk at startup replaces an os.path.exists call per sprite lookup
+SPRITE_PATHS = scan_sprites()
+
+@functools.lru_cache(maxsize=256)
+def sprite_bytes(path):
+    """Contents of a sprite file, read from disk once per path (None if missing)."""
+    if not path or os.path.normpath(path) not in SPRITE_PATHS:
+        return None
+    with open(path, "rb") as f:
+        return f.read()
+
+def sprite_file(path, filename):
+    """A fresh discord.File for a sprite, served from the in-memory copy."""
+    data = sprite_bytes(path)
+    if data is None:
+        return None
+    return discord.File(io.BytesIO(data), filename=filename)
+
+def warm_sprite_cache():
+    """Read every template sprite into sprite_bytes' cache so the first battles skip the disk."""
+    for t in (*heroes_db, *monsters_db):
+        sprite_bytes(t.get("sprite"))
+
+# Templates may point "sprite_url" at a permanent host; those sprites are linked, never uploaded.
+# (Discord attachment URLs are signed and expire, so they cannot be captured and reused here.)
+SPRITE_URLS = {
+    t["sprite"]: t["sprite_url"]
+    for t in (*heroes_db, *monsters_db)
+    if t.get("sprite") and t.get("sprite_url")
+}
+
+def sprite_ref(path, filename):
+    """(embed url, file to attach) for a sprite; hosted sprites need no file, and both are None if it is missing."""
+    url = SPRITE_URLS.get(path)
+    if url:
+        return url, None
+    file = sprite_file(path, filename)
+    if file is None:
+        return None, None
+    return f"attachment://{filename}", file
+
 # -----------------------------
 # STATS / XP HELPERS
 # -----------------------------
 
-def calc_hp(base, iv, ev, level):
-    return math.floor(((2 * base + iv + (ev // 4)) * level) / 100) + level + 10
+STATS = ("hp", "attack", "defense", "magic", "speed")
+
+def scale_stats(base, ivs, evs, level):
+    """Level-scaled stat block; integer math only (HP gets level + 10, the rest + 5)."""
+    return {
+        s: ((2 * base[s] + ivs[s] + evs[s] // 4) * level) // 100 + (level + 10 if s == "hp" else 5)
+        for s in STATS
+    }
 
-def calc_stat(base, iv, ev, level):
-    return math.floor(((2 * base + iv + (ev // 4)) * level) / 100) + 5
+# Both XP curves are pure functions of level, so levels 0-101 are tabulated once
+XP_TABLE = tuple(int(0.015 * (L ** 3) + 10 * (L ** 2)) for L in range(102))
+
+PLAYER_XP_BASE = 200     # XP to go from L1 → L2
+PLAYER_XP_GROWTH = 1.059  # tuned for ~1,000,000 total XP at L100
+PLAYER_XP_TABLE = tuple(int(PLAYER_XP_BASE * (PLAYER_XP_GROWTH ** (L - 1))) for L in range(102))
 
 def entity_xp_required(level: int) -> int:
-    return int(0.015 * (level ** 3) + 10 * (level ** 2))
+    return XP_TABLE[level]  # heroes cap at Lv.100
 
 def xp_required_for_level(level: int) -> int:
-    base = 200
-    growth = 1.059
-    return int(base * (growth ** (level - 1)))
+    if level < len(PLAYER_XP_TABLE):
+        return PLAYER_XP_TABLE[level]
+    # trainer levels are uncapped
+    return int(PLAYER_XP_BASE * (PLAYER_XP_GROWTH ** (level - 1)))
+
+# PLAYER_XP_CUM[L] = XP needed to climb from Lv.1 to Lv.L, for every level the table covers
+PLAYER_XP_CUM = (0, *accumulate(PLAYER_XP_TABLE[1:], initial=0))
+
+def advance_player_level(p):
+    """Spend banked trainer XP on level-ups; returns the level the player started from."""
+    old_level = p["level"]
+    if old_level < len(PLAYER_XP_CUM):
+        total = PLAYER_XP_CUM[old_level] + p["xp"]
+        level = bisect_right(PLAYER_XP_CUM, total, lo=old_level) - 1
+        p["level"], p["xp"] = level, total - PLAYER_XP_CUM[level]
+    # Past the end of the table, step through the formula one level at a time
+    xp_needed = xp_required_for_level(p["level"])
+    while p["xp"] >= xp_needed:
+        p["xp"] -= xp_needed
+        p["level"] += 1
+        xp_needed = xp_required_for_level(p["level"])
+    return old_level
 
 def ensure_full_ivs_evs(entity: dict):
     entity.setdefault("ivs", {})
     entity.setdefault("evs", {})
-    for s in ["hp", "attack", "defense", "magic", "speed"]:
-        entity["ivs"].setdefault(s, random.randint(0, 31))
+    for s in STATS:
+        entity["ivs"].setdefault(s, random.getrandbits(5))
         entity["evs"].setdefault(s, 0)
 
+# unique_id → (moves, IVs, stats) text for the barracks view; dropped whenever stats change
+# or the hero leaves the barracks.
+# Kept off the hero dicts so render caches never reach the player files.
+hero_text_cache: dict[str, tuple[str, str, str]] = {}
+
 def recalc_stats_from_base(entity: dict, base_stats: dict):
+    hero_text_cache.pop(entity.get("unique_id"), None)
     ivs, evs, level = entity["ivs"], entity["evs"], entity["level"]
     old_max = entity.get("stats", {}).get("hp", 1) or 1
     old_cur = entity.get("current_hp", old_max)
     hp_pct = max(0.0, min(1.0, old_cur / old_max))
 
-    entity["stats"] = {
-        "hp": calc_hp(base_stats["hp"], ivs["hp"], evs["hp"], level),
-        "attack": calc_stat(base_stats["attack"], ivs["attack"], evs["attack"], level),
-        "defense": calc_stat(base_stats["defense"], ivs["defense"], evs["defense"], level),
-        "magic": calc_stat(base_stats["magic"], ivs["magic"], evs["magic"], level),
-        "speed": calc_stat(base_stats["speed"], ivs["speed"], evs["speed"], level),
-    }
+    entity["stats"] = scale_stats(base_stats, ivs, evs, level)
     entity["current_hp"] = max(1, int(entity["stats"]["hp"] * hp_pct))
 
 def award_entity_xp(entity: dict, xp_gain: int, log: list, base_stats_provider):
@@ -167,13 +610,16 @@ def award_entity_xp(entity: dict, xp_gain: int, log: list, base_stats_provider):
         return
 
     entity["xp"] = entity.get("xp", 0) + xp_gain
-    while entity["xp"] >= entity_xp_required(entity["level"] + 1) and entity["level"] < 100:
-        entity["xp"] -= entity_xp_required(entity["level"] + 1)
+    start_level = entity["level"]
+    while entity["level"] < 100 and entity["xp"] >= XP_TABLE[entity["level"] + 1]:
+        entity["xp"] -= XP_TABLE[entity["level"] + 1]
         entity["level"] += 1
-        base = base_stats_provider(entity)
-        recalc_stats_from_base(entity, base)
         log.append(f"{entity['name']} leveled up to **Lv.{entity['level']}**")
 
+    # Stats only depend on the final level, so rebuild them once per award rather than per level
+    if entity["level"] != start_level:
+        recalc_stats_from_base(entity, base_stats_provider(entity))
+
 async def show_xp(interaction: discord.Interaction):
     user_id = str(interaction.user.id)
     if user_id not in players:
@@ -186,9 +632,7 @@ async def show_xp(interaction: discord.Interaction):
 
     # XP requirement for next level
     next_level = level + 1
-    base = 200       # XP to go from L1 → L2
-    growth = 1.059   # tuned for ~1,000,000 total XP at L100
-    xp_required =  int(base * (growth ** (next_level - 1)))
+    xp_required = xp_required_for_level(next_level)
     xp_remaining = xp_required - xp
 
     # Rewards logic
@@ -217,6 +661,24 @@ async def show_xp(interaction: discord.Interaction):
 
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
+# -----------------------------
+# BAG HELPERS
+# -----------------------------
+
+def bag_add(bag, name, amount=1):
+    bag[name] += amount
+
+def bag_consume(bag, name, amount=1):
+    """Take amount of an item out of the bag, dropping emptied entries; False (bag untouched) if short."""
+    left = bag.get(name, 0) - amount
+    if name not in bag or left < 0:
+        return False
+    if left:
+        bag[name] = left
+    else:
+        del bag[name]
+    return True
+
 # -----------------------------
 # PC HELPERS
 # -----------------------------
@@ -227,34 +689,51 @@ class PCView(discord.ui.View):
         self.user_id = user_id
         self.h = heroes
         self.index = 0
+        self._embeds: dict[int, discord.Embed] = {}  # page index → built embed
 
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
         return str(interaction.user.id) == self.user_id
 
     def get_embed(self):
-        h = self.h[self.index]
+        # Pages are built once per view; the sprite File is recreated per send since discord.py closes it
+        embed = self._embeds.get(self.index)
+        if embed is None:
+            embed = self._embeds[self.index] = self._build_embed(self.h[self.index])
+        _, file = sprite_ref(self.h[self.index].get("sprite"), "sprite.png")
+        return embed, [file] if file else []
+
+    def _build_embed(self, h):
         embed = discord.Embed(
             title=f"📦 Barracks Storage — {h['name']} (Lv.{h['level']})",
             color=discord.Color.blurple())
-        moveset = h.get("moveset", [])
-        if moveset and isinstance(moveset[0], dict):
-            moves_text = ", ".join([m.get("move") or m.get("skill") for m in moveset])
-        else:
-            moves_text = ", ".join(moveset) if moveset else "None"
+        texts = hero_text_cache.get(h["unique_id"])
+        if texts is None:
+            moveset = h.get("moveset", [])
+            if moveset and isinstance(moveset[0], dict):
+                moves_text = ", ".join([m.get("move") or m.get("skill") for m in moveset])
+            else:
+                moves_text = ", ".join(moveset) if moveset else "None"
+            texts = hero_text_cache[h["unique_id"]] = (
+                moves_text,
+                ", ".join([f"{k}:{v}" for k,v in h["ivs"].items()]),
+                ", ".join([f"{k}:{v}" for k,v in h["stats"].items()]),
+            )
+        moves_text, ivs_text, stats_text = texts
         embed.add_field(name="Shiny", value="✨ Yes" if h.get("shiny") else "No")
         short_id = h["unique_id"][:9]
         embed.add_field(name="ID", value=short_id)
-        embed.add_field(name="IVs", value=", ".join([f"{k}:{v}" for k,v in h["ivs"].items()]), inline=False)
-        embed.add_field(name="Stats", value=", ".join([f"{k}:{v}" for k,v in h["stats"].items()]), inline=False)
+        embed.add_field(name="IVs", value=ivs_text, inline=False)
+        embed.add_field(name="Stats", value=stats_text, inline=False)
         embed.add_field(name="Moves", value=moves_text)
         embed.set_footer(text=f"Hero {self.index+1}/{len(self.h)} | Caught {h.get('date_caught','Unknown')}")
 
         # If we saved a sprite path when caught, show it
-        if "sprite" in h and h["sprite"] and os.path.exists(h["sprite"]):
-            file = discord.File(h["sprite"], filename="sprite.png")
+        sprite = h.get("sprite")
+        if sprite in SPRITE_URLS:
+            embed.set_thumbnail(url=SPRITE_URLS[sprite])
+        elif sprite_bytes(sprite) is not None:
             embed.set_thumbnail(url="attachment://sprite.png")
-            return embed, [file]
-        return embed, []
+        return embed
 
     @discord.ui.button(label="⬅️ Prev", style=discord.ButtonStyle.secondary)
     async def prev_button(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -280,13 +759,19 @@ class ConfirmClearView(discord.ui.View):
     @discord.ui.button(label="✅ Yes, clear Barracks", style=discord.ButtonStyle.danger)
     async def confirm(self, interaction: discord.Interaction, button: discord.ui.Button):
         user = players[self.user_id]
-        team_ids = set(user.get("active_team", []))
-
+        # The party is the keep-list: fill its slots in one pass over the barracks
+        keep = dict.fromkeys(user.get("active_team", []))
         before = len(user.get("pc", []))
-        user["pc"] = [h for h in user.get("pc", []) if h["unique_id"] in team_ids]
+        for h in user.get("pc", []):
+            if h["unique_id"] in keep:
+                keep[h["unique_id"]] = h
+            else:
+                hero_text_cache.pop(h["unique_id"], None)
+        user["pc"] = [h for h in keep.values() if h]
+        prepare_player(user)
         after = len(user["pc"])
 
-        await save_json(PLAYER_FILE, players)
+        mark_player_dirty(self.user_id)
 
         cleared = before - after
         await interaction.response.edit_message(
@@ -304,7 +789,7 @@ class StarterSelectView(discord.ui.View):
 
     async def add_starter(self, interaction: discord.Interaction, hero_name: str):
         """Give the selected starter hero to a new player."""
-        base_data = next((h for h in heroes_db if h["name"].lower() == hero_name.lower()), None)
+        base_data = hero_by_name.get(hero_name.lower())
         if not base_data:
             await interaction.response.send_message(f"❌ Could not find data for {hero_name}.", ephemeral=True)
             return
@@ -313,26 +798,15 @@ class StarterSelectView(discord.ui.View):
         level = 10
 
         # Generate IVs & EVs
-        ivs = {s: random.randint(0, 31) for s in ["hp", "attack", "defense", "magic", "speed"]}
-        evs = {s: 0 for s in ["hp", "attack", "defense", "magic", "speed"]}
+        ivs = {s: random.getrandbits(5) for s in STATS}  # uniform 0-31
+        evs = dict.fromkeys(STATS, 0)
 
         # Calculate scaled stats
-        stats = {
-            "hp": calc_hp(base_data["stats"]["hp"], ivs["hp"], evs["hp"], level),
-            "attack": calc_stat(base_data["stats"]["attack"], ivs["attack"], evs["attack"], level),
-            "defense": calc_stat(base_data["stats"]["defense"], ivs["defense"], evs["defense"], level),
-            "magic": calc_stat(base_data["stats"]["magic"], ivs["magic"], evs["magic"], level),
-            "speed": calc_stat(base_data["stats"]["speed"], ivs["speed"], evs["speed"], level),
-        }
+        stats = scale_stats(base_data["stats"], ivs, evs, level)
 
         # Moveset — first few skills that unlock at or below level 5
         moveset = [
-            {
-                "move": s["skill"],
-                "type": s["type"],
-                "power": int(s["power"]) if str(s["power"]).isdigit() else 0,
-                "acc": int(s["acc."]) if str(s["acc."]).isdigit() else 100
-            }
+            {"move": s["skill"], "type": s["type"], "power": s["_power"], "acc": s["_acc"]}
             for s in base_data.get("skills", []) if int(s["lv."]) <= level
         ][:4] or [{"move": "Strike", "power": 40, "acc": 100}]
 
@@ -358,10 +832,10 @@ class StarterSelectView(discord.ui.View):
 
         # Save to player
         p = players[self.user_id]
-        p["pc"].append(starter)
+        add_hero(p, starter)
         p["active_team"].append(unique_id)
         p["codex"].append(base_data["id"])
-        await save_json(PLAYER_FILE, players)
+        mark_player_dirty(self.user_id)
 
         await interaction.response.edit_message(
             content=f"🎉 You chose **{base_data['name']}** the {base_data['class']} as your starter hero!",
@@ -386,34 +860,43 @@ class StarterSelectView(discord.ui.View):
 # -----------------------------
 
 def new_auction_id():
-    return f"A{uuid.uuid4().hex[:8]}"
+    # Short ids are typed by hand into /ahbuy; redraw on the rare clash rather than overwrite a listing
+    while (auc_id := f"A{uuid.uuid4().hex[:8]}") in auctions:
+        pass
+    return auc_id
+
+def auction_end_ts(auc):
+    # Listings carry a numeric end_ts; ones saved before it existed only have the ISO end_time
+    end_ts = auc.get("end_ts")
+    if end_ts is None:
+        end_ts = auc["end_ts"] = datetime.fromisoformat(auc["end_time"]).timestamp()
+    return end_ts
+
+# Min-heap of (end timestamp, auction id), so auction_cleanup only visits listings that are due;
+# entries for listings already sold out or cancelled are skipped when they surface
+auction_expiry = [(auction_end_ts(auc), auc_id) for auc_id, auc in auctions.items()]
+heapq.heapify(auction_expiry)
+
+AUCTION_DURATIONS = frozenset({12, 24, 48, 72})  # hours a listing may run
 
 def valid_duration(hours: int) -> bool:
-    return hours in [12, 24, 48, 72]
+    return hours in AUCTION_DURATIONS
 
 # -----------------------------
 # ENTITY GENERATION
 # -----------------------------
 
-def build_instance_from_template(template, level=None, is_hero=False):
-    """Generate a battle-ready instance from a hero or monster template."""
+def build_instance_from_template(template, level=None, is_hero=False, rarity=None):
+    """Generate a battle-ready instance from a hero or monster template (level/rarity override the template's)."""
     level = level or template.get("level", 10)
     shiny = is_hero and (random.random() < 1/5000)
 
     # IVs and EVs (same backend fields as Pokémon for simplicity)
-    ivs = {s: random.randint(0, 31) for s in ["hp", "attack", "defense", "magic", "speed"]}
-    evs = {s: 0 for s in ["hp", "attack", "defense", "magic", "speed"]}
-
-    stats = template["stats"]
+    ivs = {s: random.getrandbits(5) for s in STATS}  # uniform 0-31
+    evs = dict.fromkeys(STATS, 0)
 
     # Simple scaling formula similar to Pokémon stat growth
-    scaled_stats = {
-        "hp": calc_hp(stats["hp"], ivs["hp"], evs["hp"], level),
-        "attack": calc_stat(stats["attack"], ivs["attack"], evs["attack"], level),
-        "defense": calc_stat(stats["defense"], ivs["defense"], evs["defense"], level),
-        "magic": calc_stat(stats["magic"], ivs["magic"], evs["magic"], level),
-        "speed": calc_stat(stats["speed"], ivs["speed"], evs["speed"], level),
-    }
+    scaled_stats = scale_stats(template["stats"], ivs, evs, level)
 
     # Build complete entity dict
     inst = {
@@ -424,7 +907,7 @@ def build_instance_from_template(template, level=None, is_hero=False):
         "element": template.get("element", "Neutral"),
         "class": template.get("class", ""),
         "level": level,
-        "rarity": template.get("rarity", "common"),
+        "rarity": rarity or template.get("rarity", "common"),
         "shiny": shiny,
         "ivs": ivs,
         "evs": evs,
@@ -433,12 +916,7 @@ def build_instance_from_template(template, level=None, is_hero=False):
         "xp": 0,
         "xp_to_next": level * 100,
         "moveset": [
-            {
-                "move": s["skill"],
-                "type": s["type"],
-                "power": int(s["power"]) if str(s["power"]).isdigit() else 0,
-                "acc": int(s["acc."]) if str(s["acc."]).isdigit() else 100
-            }
+            {"move": s["skill"], "type": s["type"], "power": s["_power"], "acc": s["_acc"]}
             for s in template.get("skills", [])[:4]
         ],
         "sprite": template.get("sprite", ""),
@@ -452,46 +930,50 @@ def build_instance_from_template(template, level=None, is_hero=False):
 
 import random
 
-def pick_random_hero_template() -> dict:
-    """Randomly selects a hero template based on rarity weights and level scaling."""
+HERO_RARITY_WEIGHTS = {
+    "common": 50.0,
+    "uncommon": 29.9,
+    "rare": 15.0,
+    "epic": 5.0,
+    "legendary": 0.1,
+}
+MONSTER_RARITY_WEIGHTS = {
+    "common": 60.0,
+    "uncommon": 25.0,
+    "rare": 10.0,
+    "epic": 4.0,
+    "legendary": 1.0,
+}
+# Cumulative weights let random.choices skip its per-call prefix sum
+HERO_RARITY_KEYS = tuple(HERO_RARITY_WEIGHTS)
+HERO_RARITY_CUM = tuple(accumulate(HERO_RARITY_WEIGHTS.values()))
+MONSTER_RARITY_KEYS = tuple(MONSTER_RARITY_WEIGHTS)
+MONSTER_RARITY_CUM = tuple(accumulate(MONSTER_RARITY_WEIGHTS.values()))
+
+# Templates grouped by rarity once at load so a pick never rescans the databases
+HEROES_BY_RARITY = {r: [h for h in heroes_db if h.get("rarity") == r] for r in RARITIES}
+MONSTERS_BY_RARITY = {r: [m for m in monsters_db if m.get("rarity") == r] for r in RARITIES}
+
+def pick_random_hero_template() -> tuple[dict, str, int]:
+    """Randomly selects a hero template based on rarity weights and level scaling.
+
+    Returns (template, rarity, level); the template itself is shared and must not be mutated.
+    """
     if not heroes_db:
         return {
             "id": 1, "name": "Aiden", "class": "Knight", "element": "Earth",
             "stats": {"hp": 80, "attack": 70, "defense": 65, "magic": 30, "speed": 45},
             "skills": [{"skill": "Slash", "power": "50", "acc.": "100"}],
-            "rarity": "uncommon",
-            "level": 5,
-            "shiny": False
-        }
-
-    # --- Group heroes by rarity ---
-    rarity_groups = {
-        "common": [h for h in heroes_db if h.get("rarity") == "common"],
-        "uncommon": [h for h in heroes_db if h.get("rarity") == "uncommon"],
-        "rare": [h for h in heroes_db if h.get("rarity") == "rare"],
-        "epic": [h for h in heroes_db if h.get("rarity") == "epic"],
-        "legendary": [h for h in heroes_db if h.get("rarity") == "legendary"],
-    }
+        }, "uncommon", 5
 
     # --- Weighted rarity selection ---
-    rarity_weights = {
-        "common": 50.0,
-        "uncommon": 29.9,
-        "rare": 15.0,
-        "epic": 5.0,
-        "legendary": 0.1,
-    }
-
-    rarities = list(rarity_weights.keys())
-    weights = list(rarity_weights.values())
-    chosen_rarity = random.choices(rarities, weights=weights, k=1)[0]
+    chosen_rarity = random.choices(HERO_RARITY_KEYS, cum_weights=HERO_RARITY_CUM, k=1)[0]
 
     # fallback if group empty
-    if not rarity_groups[chosen_rarity]:
+    if not HEROES_BY_RARITY[chosen_rarity]:
         chosen_rarity = "common"
 
-    template = random.choice(rarity_groups[chosen_rarity])
-    shiny = random.random() < (1 / 4096)  # 1 in 4096 chance
+    template = random.choice(HEROES_BY_RARITY[chosen_rarity])
 
     # --- Level scaling ---
     if chosen_rarity == "legendary":
@@ -505,48 +987,23 @@ def pick_random_hero_template() -> dict:
     else:
         level = int(random.triangular(3, 15, 10))
 
-    # attach rarity and shiny to ensure consistent structure
-    template = {**template, "rarity": chosen_rarity, "level": level, "shiny": shiny}
-    return template
+    return template, chosen_rarity, level
 
-def pick_random_monster_template() -> dict:
+def pick_random_monster_template() -> tuple[dict, str, int]:
     """Randomly selects a monster template based on rarity weights and level scaling."""
     if not monsters_db:
         return {
             "id": 1, "name": "Slime", "element": "Water",
             "stats": {"hp": 50, "attack": 20, "defense": 15, "magic": 10, "speed": 20},
             "skills": [{"skill": "Splash", "power": "30", "acc.": "100"}],
-            "rarity": "common",
-            "level": 5,
-            "shiny": False
-        }
+        }, "common", 5
 
-    # --- Group monsters by rarity ---
-    rarity_groups = {
-        "common": [m for m in monsters_db if m.get("rarity") == "common"],
-        "uncommon": [m for m in monsters_db if m.get("rarity") == "uncommon"],
-        "rare": [m for m in monsters_db if m.get("rarity") == "rare"],
-        "epic": [m for m in monsters_db if m.get("rarity") == "epic"],
-        "legendary": [m for m in monsters_db if m.get("rarity") == "legendary"],
-    }
-
-    rarity_weights = {
-        "common": 60.0,
-        "uncommon": 25.0,
-        "rare": 10.0,
-        "epic": 4.0,
-        "legendary": 1.0,
-    }
+    chosen_rarity = random.choices(MONSTER_RARITY_KEYS, cum_weights=MONSTER_RARITY_CUM, k=1)[0]
 
-    rarities = list(rarity_weights.keys())
-    weights = list(rarity_weights.values())
-    chosen_rarity = random.choices(rarities, weights=weights, k=1)[0]
-
-    if not rarity_groups[chosen_rarity]:
+    if not MONSTERS_BY_RARITY[chosen_rarity]:
         chosen_rarity = "common"
 
-    template = random.choice(rarity_groups[chosen_rarity])
-    shiny = random.random() < (1 / 8192)  # 1 in 8192 chance
+    template = random.choice(MONSTERS_BY_RARITY[chosen_rarity])
 
     # --- Level scaling ---
     if chosen_rarity == "legendary":
@@ -560,28 +1017,18 @@ def pick_random_monster_template() -> dict:
     else:
         level = int(random.triangular(3, 20, 10))
 
-    template = {**template, "rarity": chosen_rarity, "level": level, "shiny": shiny}
-    return template
+    return template, chosen_rarity, level
 
-def pick_random_hero_template_by_rarity(target_rarity: str) -> dict:
+def pick_random_hero_template_by_rarity(target_rarity: str) -> tuple[dict, str, int]:
     """Selects a hero specifically of the given rarity (epic, legendary, etc.)."""
     if not heroes_db:
         return pick_random_hero_template()  # fallback
 
-    rarity_groups = {
-        "common": [h for h in heroes_db if h.get("rarity") == "common"],
-        "uncommon": [h for h in heroes_db if h.get("rarity") == "uncommon"],
-        "rare": [h for h in heroes_db if h.get("rarity") == "rare"],
-        "epic": [h for h in heroes_db if h.get("rarity") == "epic"],
-        "legendary": [h for h in heroes_db if h.get("rarity") == "legendary"],
-    }
-
-    group = rarity_groups.get(target_rarity.lower(), [])
+    group = HEROES_BY_RARITY.get(target_rarity.lower(), [])
     if not group:
         return pick_random_hero_template()
 
     template = random.choice(group)
-    shiny = random.random() < (1 / 4096)
 
     # level scaling tied to rarity
     if target_rarity == "legendary":
@@ -591,7 +1038,7 @@ def pick_random_hero_template_by_rarity(target_rarity: str) -> dict:
     else:
         level = int(random.triangular(15, 30, 20))
 
-    return {**template, "rarity": target_rarity, "level": level, "shiny": shiny}
+    return template, target_rarity, level
 
 # -----------------------------
 # EXPLORATION COMMAND
@@ -626,17 +1073,20 @@ async def explore(interaction: discord.Interaction):
             description=f"You’ve discovered a mysterious treasure!",
             color=0xf1c40f if "Gold" in key_type else 0xc0c0c0 if "Silver" in key_type else 0x9b59b6,
         )
-        file = discord.File(sprite, filename="chest.png")
-        embed.set_image(url="attachment://chest.png")
+        files = []
+        file = sprite_file(sprite, "chest.png")
+        if file:
+            embed.set_image(url="attachment://chest.png")
+            files.append(file)
         embed.set_footer(text="Will you attempt to unlock it?")
         view = KeyEncounterView(interaction, user_id, key_type, difficulty)
-        await interaction.response.send_message(embed=embed, view=view, file=file)
+        await interaction.response.send_message(embed=embed, view=view, files=files)
         return
 
     elif roll < 0.99:
         # ===== HERO ENCOUNTER =====
-        template = pick_random_hero_template()
-        inst = build_instance_from_template(template)
+        template, rarity, level = pick_random_hero_template()
+        inst = build_instance_from_template(template, level=level, rarity=rarity)
         rarity = inst.get("rarity", "common").lower()
         shiny = inst.get("shiny", False)
         ephemeral_setting = rarity != "legendary" or shiny != True
@@ -647,15 +1097,15 @@ async def explore(interaction: discord.Interaction):
 
         # store the full encounter persistently
         players[user_id]["encounter"] = inst
-        await save_json(PLAYER_FILE, players)
+        mark_player_dirty(user_id)
 
         shiny_icon = "✨ " if inst["shiny"] else ""
-        rarity_color = rarity_colors.get(rarity, discord.Color.light_grey())
+        rarity_label, rarity_color = RARITY_META.get(rarity) or (rarity.capitalize(), discord.Color.light_grey())
         embed = discord.Embed(
             title=f"👤 {shiny_icon}{inst['name']} Appears!",
             description=(
                 f"{inst['name']} the {template.get('class', 'wanderer')} stands before you!\n"
-                f"**{rarity.capitalize()}** — Lv.{inst['level']}"),
+                f"**{rarity_label}** — Lv.{inst['level']}"),
             color=rarity_color)
         view = RecruitView(interaction, user_id, inst)
         files = view._get_sprites(embed)
@@ -663,8 +1113,8 @@ async def explore(interaction: discord.Interaction):
 
     else:
         # ===== MONSTER ENCOUNTER =====
-        template = pick_random_monster_template()
-        inst = build_instance_from_template(template)
+        template, rarity, level = pick_random_monster_template()
+        inst = build_instance_from_template(template, level=level, rarity=rarity)
         rarity = inst.get("rarity", "common").lower()
         ephemeral_setting = rarity != "legendary"
 
@@ -672,13 +1122,13 @@ async def explore(interaction: discord.Interaction):
         inst["current_hp"] = inst["stats"]["hp"]
         inst["shiny"] = False  # monsters never shiny (for now)
 
-        players[user_id]["name"] = inst
-        rarity_color = rarity_colors.get(rarity, discord.Color.light_grey())
-        await save_json(PLAYER_FILE, players)
+        # start_battle stores the encounter and marks the player dirty
+        players[user_id]["encounter"] = inst
+        rarity_label, rarity_color = RARITY_META.get(rarity) or (rarity.capitalize(), discord.Color.light_grey())
 
         embed = discord.Embed(
             title=f"A wild {inst['name']} appeared!",
-            description=f"**{rarity.capitalize()}** — Lv.{inst['level']}\nPrepare for battle!",
+            description=f"**{rarity_label}** — Lv.{inst['level']}\nPrepare for battle!",
             color=rarity_color
         )
         await interaction.response.send_message(embed=embed, ephemeral=ephemeral_setting)
@@ -697,15 +1147,7 @@ async def use(interaction: discord.Interaction, item: str):
     bag = p.get("bag", {})
     item = item.strip()
 
-    found_relic = None
-    for hero_name, drops in LEGENDARY_DROPS.items():
-        for d in drops:
-            if d["name"].lower() == item.lower():
-                found_relic = (hero_name, d)
-                break
-        if found_relic:
-            break
-
+    found_relic = RELIC_TO_HERO.get(item.lower())
     if not found_relic:
         await interaction.response.send_message("❌ That item cannot be used or isn’t a valid relic.", ephemeral=True)
         return
@@ -729,7 +1171,7 @@ async def use(interaction: discord.Interaction, item: str):
                 "kills": 0,
                 "goal": 100
             }
-            await save_json(PLAYER_FILE, players)
+            mark_player_dirty(user_id)
             await interaction_.response.edit_message(
                 content=f"🔮 You activated the **{item}**!\nDefeat **100 monsters** to fill it with souls...",
                 view=None
@@ -767,27 +1209,17 @@ async def summon(interaction: discord.Interaction, item: str):
         return
 
     # Match relic → legendary hero
-    hero_name = None
-    for k, v in LEGENDARY_DROPS.items():
-        for drop in v:
-            if f"filled {drop['name']}".lower() == item:
-                hero_name = k
-                break
-        if hero_name:
-            break
-
+    hero_name = FILLED_RELIC_TO_HERO.get(item)
     if not hero_name:
         await interaction.response.send_message("❌ That relic doesn’t summon anyone.", ephemeral=True)
         return
 
     # Consume relic
-    bag[item] -= 1
-    if bag[item] <= 0:
-        del bag[item]
-    await save_json(PLAYER_FILE, players)
+    bag_consume(bag, item)
+    mark_player_dirty(user_id)
 
     # Find hero data
-    hero_data = next((h for h in heroes_db if h["name"].lower() == hero_name.lower()), None)
+    hero_data = hero_by_name.get(hero_name.lower())
     if not hero_data:
         await interaction.response.send_message(f"⚠️ Hero data for {hero_name} not found.", ephemeral=True)
         return
@@ -805,11 +1237,11 @@ async def summon(interaction: discord.Interaction, item: str):
         color=discord.Color.gold()
     )
 
-    sprite_path = inst.get("sprite")
     files = []
-    if sprite_path and os.path.exists(sprite_path):
-        file = discord.File(sprite_path, filename="sprite.png")
-        embed.set_thumbnail(url="attachment://sprite.png")
+    url, file = sprite_ref(inst.get("sprite"), "sprite.png")
+    if url:
+        embed.set_thumbnail(url=url)
+    if file:
         files = [file]
 
     view = RecruitView(interaction, user_id, inst)
@@ -819,6 +1251,18 @@ async def summon(interaction: discord.Interaction, item: str):
 # PERSON ENCONTER
 # -----------------------------
 
+# Contract success multiplier by the target's rarity
+rarity_modifiers = {
+    "common": 1.0,
+    "uncommon": 0.9,
+    "rare": 0.75,
+    "epic": 0.5,
+    "legendary": 0.3,
+}
+
+# Fields a recruited hero keeps from its encounter instance
+RECRUIT_KEYS = ("id", "name", "element", "class", "level", "rarity", "shiny", "ivs", "evs", "stats", "sprite")
+
 class RecruitView(discord.ui.View):
     def __init__(self, interaction: discord.Interaction, player_id: str, target_hero: dict):
         super().__init__(timeout=60)
@@ -833,10 +1277,10 @@ class RecruitView(discord.ui.View):
         """Attach both player + enemy sprites."""
         files = []
         # Enemy sprite
-        enemy_sprite = self.target.get("sprite")
-        if enemy_sprite and os.path.exists(enemy_sprite):
-            f = discord.File(enemy_sprite, filename="enemy.png")
-            embed.set_thumbnail(url="attachment://enemy.png")
+        url, f = sprite_ref(self.target.get("sprite"), "enemy.png")
+        if url:
+            embed.set_thumbnail(url=url)
+        if f:
             files.append(f)
         return files
     
@@ -846,24 +1290,12 @@ class RecruitView(discord.ui.View):
             await interaction.response.send_message("⚠️ Create a profile with `/profile` first.", ephemeral=True)
             return
 
-        bag = p.setdefault("bag", {})
-        if bag.get(contract_name, 0) <= 0:
+        # Consume one contract
+        if not bag_consume(p["bag"], contract_name):
             await interaction.response.send_message(f"❌ You don’t have any **{contract_name}s** left!", ephemeral=True)
             return
 
-        # Consume one contract
-        bag[contract_name] -= 1
-        if bag[contract_name] <= 0:
-            del bag[contract_name]
-
         # Calculate success
-        rarity_modifiers = {
-            "common": 1.0,
-            "uncommon": 0.9,
-            "rare": 0.75,
-            "epic": 0.5,
-            "legendary": 0.3,
-        }
         rarity = self.target.get("rarity", "common").lower()
         success_chance = base_chance * rarity_modifiers.get(rarity, 1.0)
 
@@ -872,17 +1304,17 @@ class RecruitView(discord.ui.View):
 
         # Attempt recruitment
         if random.random() <= success_chance:
-            hero = encounter.copy()
+            hero = {k: encounter[k] for k in RECRUIT_KEYS if k in encounter}
             hero["unique_id"] = f"h{uuid.uuid4().hex[:9]}"
             hero["date_recruited"] = datetime.now().isoformat()
             hero["current_hp"] = hero["stats"]["hp"]
             hero["moveset"] = encounter.get("moveset", encounter.get("skills", []))
 
             # XP tracking (these fields are stable from encounter)
-            hero.setdefault("xp", 0)
-            hero.setdefault("xp_to_next", entity_xp_required(hero["level"] + 1))
+            hero["xp"] = encounter.get("xp", 0)
+            hero["xp_to_next"] = encounter["xp_to_next"] if "xp_to_next" in encounter else entity_xp_required(hero["level"] + 1)
 
-            p["pc"].append(hero)
+            add_hero(p, hero)
             if len(p["active_team"]) < 6:
                 p["active_team"].append(hero["unique_id"])
             if hero["id"] not in p["codex"]:
@@ -896,43 +1328,32 @@ class RecruitView(discord.ui.View):
             if "encounter" in p:
                 del p["encounter"]
 
-            await save_json(PLAYER_FILE, players)
+            mark_player_dirty(self.player_id)
 
             shiny_icon = "✨ " if hero.get("shiny") else ""
             embed = discord.Embed(
                 title="🎉 Recruitment Successful!",
                 description=f"📜 You used a **{contract_name}**!\n{shiny_icon}**{hero['name']}** joined your party!" + codex_msg,
-                color=discord.Color.green(),
+                color=COLOR_GREEN,
             )
-            if not interaction.response.is_done():
-                await interaction.response.edit_message(embed=embed, attachments=[], view=None)
-            else:
-                await interaction.edit_original_response(embed=embed, attachments=[], view=None)
+            await interaction.response.edit_message(embed=embed, attachments=[], view=None)
 
         else:
             embed = discord.Embed(
                 title="❌ Recruitment Failed",
                 description=f"Your **{contract_name}** failed to persuade **{encounter['name']}**!",
-                color=discord.Color.red(),
+                color=COLOR_RED,
             )
 
             # Determine outcome after failure
             if random.random() < 0.25:  # 25% chance of battle
                 embed.set_footer(text="They've lost patience and attack!")
-                if not interaction.response.is_done():
-                    await interaction.response.edit_message(embed=embed, view=None)
-                else:
-                    await interaction.edit_original_response(embed=embed, view=None)
-
-                message = await interaction.original_response()
-                await start_battle(interaction, self.player_id, encounter, message)
+                await interaction.response.edit_message(embed=embed, view=None)
+                await start_battle(interaction, self.player_id, encounter, await interaction.original_response())
 
             else:  # 75% chance to allow another attempt
                 embed.set_footer(text="They hesitate... maybe you can try again.")
-                if not interaction.response.is_done():
-                    await interaction.response.edit_message(embed=embed, attachments=[], view=self)
-                else:
-                    await interaction.edit_original_response(embed=embed, attachments=[], view=self)
+                await interaction.response.edit_message(embed=embed, attachments=[], view=self)
 
     # ----------------------------
     # BUTTONS
@@ -967,21 +1388,23 @@ class RecruitView(discord.ui.View):
         embed = discord.Embed(
             title=f"⚔️ Battle — {encounter['name']} challenges you!",
             description=f"Prepare for battle against **{encounter['name']}**!",
-            color=discord.Color.red()
+            color=COLOR_RED
         )
-        if not interaction.response.is_done():
-            await interaction.response.edit_message(embed=embed, view=None)
-        else:
-            await interaction.edit_original_response(embed=embed, view=None)
+        await interaction.response.edit_message(embed=embed, view=None)
 
         # Start the actual battle using the same message
-        message = await interaction.original_response()
-        await start_battle(interaction, self.player_id, encounter, message)
+        await start_battle(interaction, self.player_id, encounter, await interaction.original_response())
 
 # -----------------------------
 # KEY ENCOUNTER
 # -----------------------------
 
+# Chest contents per key tier: coin range, contract range, potion range, contract item
+CHEST_REWARDS = {
+    "silver": ((5000, 15000), (4, 8), (6, 12), "Great Contract"),
+    "gold": ((20000, 40000), (4, 8), (8, 18), "Ancient Contract"),
+}
+
 class KeyEncounterView(discord.ui.View):
     def __init__(self, interaction: discord.Interaction, player_id: str, key_type: str, difficulty: str):
         super().__init__(timeout=60)
@@ -992,75 +1415,61 @@ class KeyEncounterView(discord.ui.View):
 
     @discord.ui.button(label="Unlock", style=discord.ButtonStyle.green, emoji="🗝️")
     async def unlock_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await interaction.response.defer(thinking=True)
         p = players.get(self.player_id)
         if not p:
-            await interaction.followup.send("⚠️ Create a profile first with `/profile`.", ephemeral=True)
+            await interaction.response.send_message("⚠️ Create a profile first with `/profile`.", ephemeral=True)
             return
 
-        bag = p.setdefault("bag", {})
+        bag = p["bag"]
         
+        # Consume one key
         key_name = f"{self.key_type}"
-        if bag.get(key_name, 0) <= 0:
-            await interaction.followup.send(f"❌ You don’t have a **{key_name}** to unlock this!", ephemeral=True)
+        if not bag_consume(bag, key_name):
+            await interaction.response.send_message(f"❌ You don’t have a **{key_name}** to unlock this!", ephemeral=True)
             return
 
-        # Consume one key
-        bag[key_name] -= 1
-        if bag[key_name] <= 0:
-            del bag[key_name]
-        
-        # 🗑️ Delete the original encounter message (removes button)
-        try:
-            await interaction.message.delete()
-        except Exception:
-            pass
-
         # --------------------------
         # SILVER / GOLD — Treasure Chest
         # --------------------------
-        if self.difficulty in ("silver", "gold"):
-            reward_coins = random.randint(5000, 15000) if self.difficulty == "silver" else random.randint(20000, 40000)
-            contracts = random.randint(4, 8)
-            potions = random.randint(6, 12) if self.difficulty == "silver" else random.randint(8, 18)
+        if self.difficulty in CHEST_REWARDS:
+            coin_range, contract_range, potion_range, contract_item = CHEST_REWARDS[self.difficulty]
+            reward_coins = random.randint(*coin_range)
+            contracts = random.randint(*contract_range)
+            potions = random.randint(*potion_range)
             hero_spawn = random.random() < 0.20  # 20% chance for epic hero
 
             p["coins"] = p.get("coins", 0) + reward_coins
-            if self.difficulty == "silver":
-                contracttext = "Great Contracts"
-                bag["Great Contract"] = bag.get("Great Contract", 0)
-            else:
-                contracttext = "Ancient Contracts"
-                bag["Ancient Contract"] = bag.get("Ancient Contract", 0) + contracts
-            bag["Potion"] = bag.get("Potion", 0) + potions
-            await save_json(PLAYER_FILE, players)
+            contracttext = f"{contract_item}s"
+            bag_add(bag, contract_item, contracts)
+            bag_add(bag, "Potion", potions)
+            mark_player_dirty(self.player_id)
 
             msg = f"You unlocked the {self.key_type} chest!\n\n"
             msg += f"**Rewards**\n- {reward_coins} coins\n- {potions} Potions\n- {contracts} {contracttext}"
 
             if hero_spawn:
                 msg += f"\n🌟 An **Epic Hero** has emerged from the treasure!"
-                embed = discord.Embed(title="🎁 Chest Opened!", description=msg, color=discord.Color.gold())
-                await interaction.followup.send(embed=embed)
-                hero_template = pick_random_hero_template_by_rarity("epic")
-                hero_inst = build_instance_from_template(hero_template, is_hero=True)
+                chest_embed = discord.Embed(title="🎁 Chest Opened!", description=msg, color=COLOR_GOLD)
+                hero_template, rarity, level = pick_random_hero_template_by_rarity("epic")
+                hero_inst = build_instance_from_template(hero_template, level=level, is_hero=True, rarity=rarity)
                 hero_inst["shiny"] = (random.randint(1, 20) == 1)
-                players[self.player_id]["encounter"] = hero_inst
-                await save_json(PLAYER_FILE, players)
+                p["encounter"] = hero_inst
+                mark_player_dirty(self.player_id)
 
                 shiny_icon = "✨ " if hero_inst.get("shiny") else ""
-                rarity_color = rarity_colors.get("epic", discord.Color.purple())
+                rarity_color = rarity_colors["epic"]
                 embed = discord.Embed(
                     title=f"👤 {shiny_icon}{hero_inst['name']} Appears!",
                     description=f"{hero_inst['name']} the {hero_template.get('class', 'Hero')} stands before you!",
                     color=rarity_color
                 )
                 view = RecruitView(interaction, self.player_id, hero_inst)
-                await interaction.followup.send(embed=embed, view=view)
+                # Chest result and the recruit prompt replace the key message in one edit
+                await interaction.response.edit_message(embeds=[chest_embed, embed], attachments=[], view=view)
                 return
 
-            embed = discord.Embed(title="🎁 Chest Opened!", description=msg, color=discord.Color.gold())
-            await interaction.followup.send(embed=embed)
+            embed = discord.Embed(title="🎁 Chest Opened!", description=msg, color=COLOR_GOLD)
+            await interaction.response.edit_message(embed=embed, attachments=[], view=None)
             return
 
         # --------------------------
@@ -1074,20 +1483,54 @@ class KeyEncounterView(discord.ui.View):
             )
             embed.set_image(url="https://yourcdn.com/ancient_gate.png")
 
-            await interaction.followup.send(embed=embed)
+            await interaction.response.edit_message(embed=embed, attachments=[], view=None)
 
-            boss_template = pick_random_hero_template_by_rarity("legendary")
-            boss_inst = build_instance_from_template(boss_template, level=85, is_hero=True)
-            players[self.player_id]["encounter"] = boss_inst
-            await save_json(PLAYER_FILE, players)
+            boss_template, rarity, _ = pick_random_hero_template_by_rarity("legendary")
+            boss_inst = build_instance_from_template(boss_template, level=85, is_hero=True, rarity=rarity)
+            p["encounter"] = boss_inst
+            mark_player_dirty(self.player_id)
 
-            message = await interaction.original_response()
-            await start_battle(interaction, self.player_id, boss_inst, message)
+            await start_battle(interaction, self.player_id, boss_inst, await interaction.original_response())
 
 # -----------------------------
 # BATTLE ENCOUNTER
 # -----------------------------
 
+def move_label(m):
+    """Return a string label from a move entry that might be a dict or string."""
+    if isinstance(m, dict):
+        return m.get("skill") or m.get("move") or str(m)
+    return str(m)
+
+def hp_lines(*entities):
+    """One "**Name HP:** cur/max" line per combatant, appended to a battle embed's description."""
+    return "\n".join(
+        f"**{e['name']} HP:** {e.get('current_hp', e['stats']['hp'])}/{e['stats']['hp']}" for e in entities
+    )
+
+def build_move_index(entity):
+    """Map lowercased move labels to (label, accuracy, power, type); power is None for support moves."""
+    index = {}
+    for entry in entity.get("moveset", []):
+        label = move_label(entry)
+        key = label.lower()
+        if not label or key in index:
+            continue  # first entry wins, as the old linear scan did
+        if not isinstance(entry, dict):
+            index[key] = (label, 100, 40, "Physical")
+            continue
+        acc_raw = entry.get("acc") or entry.get("acc.") or 100
+        try:
+            acc_val = int(str(acc_raw).replace("%", "").strip() or 100)
+        except Exception:
+            acc_val = 100
+        try:
+            power = int(entry.get("power", 40))
+        except Exception:
+            power = None
+        index[key] = (label, acc_val, power, entry.get("type", "Physical"))
+    return index
+
 async def start_battle(interaction: discord.Interaction, player_id: str, enemy_inst: dict, message: discord.Message):
     p = players[player_id]
     if not p["active_team"]:
@@ -1095,32 +1538,70 @@ async def start_battle(interaction: discord.Interaction, player_id: str, enemy_i
         return
 
     lead_id = p["active_team"][0]
-    lead = next((m for m in p["pc"] if m["unique_id"] == lead_id), None)
+    lead = p["_pc_index"].get(lead_id)
     if not lead:
         await interaction.response.send_message("❌ Could not find your lead hero.", ephemeral=True)
         return
 
-    # Correct HP display
-    cur_hp = lead.get("current_hp", lead["stats"]["hp"])
-    max_hp = lead["stats"]["hp"]
-    enemy_cur = enemy_inst.get("current_hp", enemy_inst["stats"]["hp"])
-    enemy_max = enemy_inst["stats"]["hp"]
-
     embed = discord.Embed(
         title="⚔️ Battle Started",
-        description=f"{lead['name']} vs {enemy_inst['name']}!",
-        color=discord.Color.red())
-    embed.add_field(name=f"{lead['name']} HP", value=f"{cur_hp}/{max_hp}")
-    embed.add_field(name=f"{enemy_inst['name']} HP", value=f"{enemy_cur}/{enemy_max}")
+        description=f"{lead['name']} vs {enemy_inst['name']}!\n\n{hp_lines(lead, enemy_inst)}",
+        color=COLOR_RED)
 
     view = BattleView(interaction, lead, enemy_inst, p["active_team"])
-    players[player_id]["encounter"] = enemy_inst
+    p["encounter"] = enemy_inst
     files = view._get_sprites(embed)
-    await save_json(PLAYER_FILE, players)
+    mark_player_dirty(player_id)
 
     msg = await message.edit(embed=embed, attachments=files, view=view)
     view.message = msg
 
+@dataclass(slots=True)
+class BattleRewards:
+    """Rewards accumulated across a whole battle; handed to the next view on swaps and boss waves."""
+    reward_log: list = field(default_factory=list)
+    total_coins: int = 0
+    total_trainer_xp: int = 0
+    total_hero_xp: int = 0
+    drop_summary: Counter = field(default_factory=Counter)
+
+class SwapSelectView(discord.ui.View):
+    """Hero picker shown over a battle; the chosen hero is swapped into the parent BattleView in place."""
+    def __init__(self, parent, heroes, swap_text):
+        super().__init__(timeout=30)
+        self.parent = parent
+        self.heroes = {h["unique_id"]: h for h in heroes}
+        self.swap_text = swap_text  # formatted with the chosen hero's name and level
+
+        select = discord.ui.Select(
+            placeholder="Select a hero...",
+            min_values=1,
+            max_values=1,
+            options=[
+                discord.SelectOption(
+                    label=f"{h['name']} (Lv.{h['level']})",
+                    description=f"HP: {h.get('current_hp', h['stats']['hp'])}/{h['stats']['hp']}",
+                    value=h["unique_id"]
+                )
+                for h in heroes
+            ]
+        )
+        select.callback = self.select_callback
+        self.add_item(select)
+
+    async def select_callback(self, interaction: discord.Interaction):
+        hero_id = interaction.data["values"][0]
+        chosen = self.heroes[hero_id]
+        chosen.setdefault("current_hp", chosen["stats"]["hp"])
+        parent = self.parent
+        parent.player_hero = chosen
+        parent._refresh_move_buttons()
+        parent._last_rendered = None  # the message now shows the swap frame
+
+        embed, files = parent._render_battle([self.swap_text.format(name=chosen["name"], level=chosen["level"])])
+        await interaction.response.edit_message(embed=embed, attachments=files, view=parent)
+        self.stop()
+
 class BattleView(discord.ui.View):
     def __init__(
         self,
@@ -1129,7 +1610,7 @@ class BattleView(discord.ui.View):
         enemy: dict,
         team: list,
         *,
-        carry: dict | None = None,
+        carry: BattleRewards | None = None,
         start_of_battle: bool = False,
     ):
         super().__init__(timeout=120)
@@ -1139,22 +1620,13 @@ class BattleView(discord.ui.View):
         self.team = team
 
         # ===== Accumulated rewards across the whole battle =====
-        if carry:
-            self.reward_log = carry.get("reward_log", [])
-            self.total_coins = carry.get("total_coins", 0)
-            self.total_trainer_xp = carry.get("total_trainer_xp", 0)
-            self.total_hero_xp = carry.get("total_hero_xp", 0)
-            self.drop_summary = carry.get("drop_summary", {})
-        else:
-            self.reward_log = []
-            self.total_coins = 0
-            self.total_trainer_xp = 0
-            self.total_hero_xp = 0
-            self.drop_summary = {}
+        self.rewards = carry or BattleRewards()
 
         if start_of_battle:
-            for hero_id in players[self.user_id]["active_team"]:
-                hero = next((h for h in players[self.user_id]["pc"] if h["unique_id"] == hero_id), None)
+            p = players[self.user_id]
+            pc_index = p["_pc_index"]
+            for hero_id in p["active_team"]:
+                hero = pc_index.get(hero_id)
                 if hero and "current_hp" not in hero:
                     hero["current_hp"] = hero["stats"]["hp"]
 
@@ -1162,50 +1634,43 @@ class BattleView(discord.ui.View):
         self.player_hero.setdefault("current_hp", self.player_hero["stats"]["hp"])
         self.enemy.setdefault("current_hp", self.enemy["stats"]["hp"])
 
-        moves = []
-
-        # Prefer moveset first (usually copied from encounter)
-        if "moveset" in self.player_hero:
-            for move in self.player_hero["moveset"]:
-                if isinstance(move, dict):
-                    label = move.get("move") or move.get("skill")
-                else:
-                    label = str(move)
-                if label:
-                    moves.append(label)
-
-        # Add buttons for each move
-        for move_name in moves:
-            btn = discord.ui.Button(label=move_name, style=discord.ButtonStyle.primary)
-            btn.callback = self.make_move_callback(move_name)
-            self.add_item(btn)
+        # Movesets are parsed once per hero; swaps rebuild the player side in _refresh_move_buttons
+        self.enemy_moves = build_move_index(self.enemy)
+        self.enemy_move_keys = tuple(self.enemy_moves) or ("strike",)  # a moveless enemy "tries" Strike
 
         # Run button
-        run_btn = discord.ui.Button(label="🏃 Retreat", style=discord.ButtonStyle.danger)
-        run_btn.callback = self.run_callback
-        self.add_item(run_btn)
+        self.run_btn = discord.ui.Button(label="🏃 Retreat", style=discord.ButtonStyle.danger)
+        self.run_btn.callback = self.run_callback
 
         # Swap button
-        swap_btn = discord.ui.Button(label="🔄 Swap", style=discord.ButtonStyle.secondary)
-        swap_btn.callback = self.swap_callback
-        self.add_item(swap_btn)
+        self.swap_btn = discord.ui.Button(label="🔄 Swap", style=discord.ButtonStyle.secondary)
+        self.swap_btn.callback = self.swap_callback
 
-    def _carry_state(self) -> dict:
-        return {
-            "reward_log": self.reward_log,
-            "total_coins": self.total_coins,
-            "total_trainer_xp": self.total_trainer_xp,
-            "total_hero_xp": self.total_hero_xp,
-            "drop_summary": self.drop_summary,
-        }
+        self._refresh_move_buttons()
+
+        # (log, hero, both HPs, buttons shown) of the last battle frame this view sent
+        self._last_rendered = None
+
+    def _refresh_move_buttons(self):
+        """Rebuild the move buttons for the current player hero, keeping Retreat and Swap last."""
+        self.player_moves = build_move_index(self.player_hero)
+        self.clear_items()
+
+        # Add buttons for each move
+        for move_key, (label, *_) in self.player_moves.items():
+            btn = discord.ui.Button(label=label, style=discord.ButtonStyle.primary, custom_id=f"mv:{move_key}")
+            btn.callback = self.move_callback
+            self.add_item(btn)
+
+        self.add_item(self.run_btn)
+        self.add_item(self.swap_btn)
 
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
         return str(interaction.user.id) == self.user_id
 
-    def make_move_callback(self, move_name: str):
-        async def callback(interaction: discord.Interaction):
-            await self.process_turn(interaction, move_name)
-        return callback
+    async def move_callback(self, interaction: discord.Interaction):
+        # Every move button shares this callback; the move key rides in the "mv:<key>" custom_id
+        await self.process_turn(interaction, interaction.data["custom_id"][3:])
 
     # -------------------------
     # Sprite Handling
@@ -1214,24 +1679,43 @@ class BattleView(discord.ui.View):
         """Attach both player + enemy sprites."""
         files = []
         # Enemy sprite
-        enemy_sprite = self.enemy.get("sprite")
-        if enemy_sprite and os.path.exists(enemy_sprite):
-            f = discord.File(enemy_sprite, filename="enemy.png")
-            embed.set_thumbnail(url="attachment://enemy.png")
+        url, f = sprite_ref(self.enemy.get("sprite"), "enemy.png")
+        if url:
+            embed.set_thumbnail(url=url)
+        if f:
             files.append(f)
         # Player sprite
-        hero_sprite = self.player_hero.get("sprite")
-        if hero_sprite and os.path.exists(hero_sprite):
-            f = discord.File(hero_sprite, filename="hero.png")
-            embed.set_image(url="attachment://hero.png")
+        url, f = sprite_ref(self.player_hero.get("sprite"), "hero.png")
+        if url:
+            embed.set_image(url=url)
+        if f:
             files.append(f)
         return files
 
+    def _render_battle(self, lines, title=None):
+        """The battle embed (log lines, then both HP lines) and its sprite attachments."""
+        embed = discord.Embed(
+            title=title or f"⚔️ Battle — {self.player_hero['name']} vs {self.enemy['name']}",
+            description="\n".join(lines) + f"\n\n{hp_lines(self.player_hero, self.enemy)}",
+            color=COLOR_ORANGE,
+        )
+        return embed, self._get_sprites(embed)
+
+    async def _edit_battle(self, interaction, log, view):
+        """Edit in the battle frame for ``log``, skipping the edit if it would change nothing."""
+        state = (tuple(log), self.player_hero["unique_id"], self.player_hero["current_hp"],
+                 self.enemy["current_hp"], view is not None)
+        if state == self._last_rendered:
+            return
+        embed, files = self._render_battle(log)
+        await interaction.edit_original_response(embed=embed, attachments=files, view=view)
+        self._last_rendered = state
+
     # -------------------------
     # Run
     # -------------------------
     async def run_callback(self, interaction: discord.Interaction):
-        embed = discord.Embed(title="🏃 You retreated from battle!", color=discord.Color.red())
+        embed = discord.Embed(title="🏃 You retreated from battle!", color=COLOR_RED)
         files = self._get_sprites(embed)
         await interaction.response.edit_message(embed=embed, attachments=files, view=None)
 
@@ -1246,8 +1730,8 @@ class BattleView(discord.ui.View):
             await interaction.response.send_message("⚠️ You have no heroes to swap with.", ephemeral=True)
             return
 
-        team_ids = player_data["active_team"]
-        team_heroes = [h for h in player_data["pc"] if h["unique_id"] in team_ids]
+        pc_index = player_data["_pc_index"]
+        team_heroes = [pc_index[i] for i in player_data["active_team"] if i in pc_index]
         valid_swaps = [h for h in team_heroes if h["unique_id"] != self.player_hero["unique_id"] and h.get("current_hp", h["stats"]["hp"]) > 0]
 
         if not valid_swaps:
@@ -1257,7 +1741,7 @@ class BattleView(discord.ui.View):
         embed = discord.Embed(
             title="🔄 Choose a Hero to Swap",
             description="Pick one of your healthy party members:",
-            color=discord.Color.blurple()
+            color=COLOR_BLURPLE
         )
         for hero in valid_swaps:
             cur_hp = hero.get("current_hp", hero["stats"]["hp"])
@@ -1268,111 +1752,33 @@ class BattleView(discord.ui.View):
                 inline=False
             )
 
-        class SwapSelect(discord.ui.View):
-            def __init__(self, parent, heroes):
-                super().__init__(timeout=30)
-                self.parent = parent
-                self.heroes = {h["unique_id"]: h for h in heroes}
-
-                select = discord.ui.Select(
-                    placeholder="Select a hero...",
-                    min_values=1,
-                    max_values=1,
-                    options=[
-                        discord.SelectOption(
-                            label=f"{h['name']} (Lv.{h['level']})",
-                            description=f"HP: {h.get('current_hp', h['stats']['hp'])}/{h['stats']['hp']}",
-                            value=h["unique_id"]
-                        )
-                        for h in heroes
-                    ]
-                )
-                select.callback = self.select_callback
-                self.add_item(select)
-
-            async def select_callback(self, interaction: discord.Interaction):
-                hero_id = interaction.data["values"][0]
-                chosen = self.heroes[hero_id]
-                chosen.setdefault("current_hp", chosen["stats"]["hp"])
-                self.parent.player_hero = chosen
-
-                embed = discord.Embed(
-                    title=f"⚔️ Battle — {chosen['name']} vs {self.parent.enemy['name']}",
-                    description=f"You swapped to {chosen['name']} (Lv.{chosen['level']})!",
-                    color=discord.Color.orange()
-                )
-                embed.add_field(
-                    name=f"{chosen['name']} HP",
-                    value=f"{chosen['current_hp']}/{chosen['stats']['hp']}"
-                )
-                embed.add_field(
-                    name=f"{self.parent.enemy['name']} HP",
-                    value=f"{self.parent.enemy['current_hp']}/{self.parent.enemy['stats']['hp']}"
-                )
-
-                new_view = BattleView(
-                    interaction,
-                    chosen,
-                    self.parent.enemy,
-                    self.parent.team,
-                    carry=self.parent._carry_state(),
-                    start_of_battle=False,
-                )
-                files = self.parent._get_sprites(embed)
-                await interaction.response.edit_message(embed=embed, attachments=files, view=new_view)
-                self.stop()
-
-        await interaction.response.edit_message(embed=embed, attachments=[], view=SwapSelect(self, valid_swaps))
+        view = SwapSelectView(self, valid_swaps, "You swapped to {name} (Lv.{level})!")
+        await interaction.response.edit_message(embed=embed, attachments=[], view=view)
 
     # -------------------------
     # Process Turn
     # -------------------------
-    async def process_turn(self, interaction: discord.Interaction, move_name: str):
+    async def process_turn(self, interaction: discord.Interaction, move_key: str):
+        # ACK first: a turn can run the whole reward pipeline before its single edit
+        await interaction.response.defer()
         log = []
 
         # --- helpers ---
-        def _label(m):
-            """Return a string label from a move entry that might be a dict or string."""
-            if isinstance(m, dict):
-                return m.get("skill") or m.get("move") or str(m)
-            return str(m)
-
-        def resolve_move(attacker: dict, defender: dict, chosen_move):
-            """Handles accuracy, damage, and log line for one move."""
-            mv_name = _label(chosen_move)
-
-            # find the move data (attacker moveset entries may be dicts or strings)
-            mvdata = None
-            for entry in attacker.get("moveset", []):
-                if isinstance(entry, dict):
-                    if (_label(entry)).lower() == mv_name.lower():
-                        mvdata = entry
-                        break
-                else:
-                    if _label(entry).lower() == mv_name.lower():
-                        mvdata = {"move": _label(entry), "power": 40, "acc": 100}
-                        break
-
+        def resolve_move(attacker: dict, defender: dict, key: str, moves: dict, acc_roll: int):
+            """Handles accuracy, damage, and log line for one move (acc_roll is 1-100)."""
+            mvdata = moves.get(key)
             if not mvdata:
-                return f"{attacker['name']} tried **{mv_name}**, but it failed!"
+                return f"{attacker['name']} tried **{key.capitalize()}**, but it failed!"
+            mv_name, acc_val, power, type = mvdata
 
             # accuracy
-            acc_raw = mvdata.get("acc") or mvdata.get("acc.") or 100
-            try:
-                acc_val = int(str(acc_raw).replace("%", "").strip() or 100)
-            except Exception:
-                acc_val = 100
-            if random.randint(1, 100) > acc_val:
+            if acc_roll > acc_val:
                 return f"{attacker['name']} used **{mv_name}**, but it missed!"
 
             # power / damage
-            pwr_raw = mvdata.get("power", 40)
-            try:
-                power = int(pwr_raw)
-            except Exception:
+            if power is None:
                 # treat as support / non-damaging
                 return f"{attacker['name']} used **{mv_name}** — it's a support move!"
-            type = mvdata.get("type", "Physical")
             if type == "Magical":
                 dmg = max(1, (power + attacker["stats"]["magic"] // 2) - (defender["stats"]["defense"] // 3))
             else:
@@ -1384,25 +1790,22 @@ class BattleView(discord.ui.View):
         player_speed = self.player_hero["stats"]["speed"]
         enemy_speed = self.enemy["stats"]["speed"]
 
-        enemy_mv_choice = random.choice(self.enemy.get("moveset", ["Strike"]))
-        enemy_mv_label = _label(enemy_mv_choice)
+        # One draw per turn, sliced into 16-bit fields: enemy move, two accuracy rolls, speed tie
+        r = random.getrandbits(64)
+        enemy_mv_key = self.enemy_move_keys[(r & 0xFFFF) % len(self.enemy_move_keys)]
+        acc_rolls = (((r >> 16) & 0xFFFF) % 100 + 1, ((r >> 32) & 0xFFFF) % 100 + 1)
 
-        if player_speed > enemy_speed:
-            order = [("player", move_name), ("enemy", enemy_mv_label)]
-        elif enemy_speed > player_speed:
-            order = [("enemy", enemy_mv_label), ("player", move_name)]
+        if player_speed > enemy_speed or (player_speed == enemy_speed and (r >> 48) & 1):
+            order = [("player", move_key), ("enemy", enemy_mv_key)]
         else:
-            order = random.choice([
-                [("player", move_name), ("enemy", enemy_mv_label)],
-                [("enemy", enemy_mv_label), ("player", move_name)],
-            ])
+            order = [("enemy", enemy_mv_key), ("player", move_key)]
 
         # --- execute ---
-        for side, mv in order:
+        for (side, mv), acc_roll in zip(order, acc_rolls):
             if side == "player" and self.player_hero["current_hp"] > 0 and self.enemy["current_hp"] > 0:
-                log.append(resolve_move(self.player_hero, self.enemy, mv))
+                log.append(resolve_move(self.player_hero, self.enemy, mv, self.player_moves, acc_roll))
             elif side == "enemy" and self.enemy["current_hp"] > 0 and self.player_hero["current_hp"] > 0:
-                log.append(resolve_move(self.enemy, self.player_hero, mv))
+                log.append(resolve_move(self.enemy, self.player_hero, mv, self.enemy_moves, acc_roll))
 
             # enemy defeated => handle rewards (that function edits the message and returns here)
             if self.enemy["current_hp"] <= 0:
@@ -1416,27 +1819,27 @@ class BattleView(discord.ui.View):
 
                 p = players.get(self.user_id)
                 if not p:
-                    embed = discord.Embed(title="❌ Defeat", description="\n".join(log), color=discord.Color.red())
-                    await interaction.response.edit_message(embed=embed, view=None)
+                    embed = discord.Embed(title="❌ Defeat", description="\n".join(log), color=COLOR_RED)
+                    await interaction.edit_original_response(embed=embed, view=None)
                     return
 
-                team_ids = p.get("active_team", [])
-                team_heroes = [h for h in p["pc"] if h["unique_id"] in team_ids]
+                pc_index = p["_pc_index"]
+                team_heroes = [pc_index[i] for i in p.get("active_team", []) if i in pc_index]
                 healthy = [h for h in team_heroes if h.get("current_hp", h["stats"]["hp"]) > 0]
 
                 if not healthy:
                     embed = discord.Embed(
                         title="❌ All Heroes Have Fallen!",
                         description="\n".join(log) + "\nYour party has been defeated...",
-                        color=discord.Color.red(),
+                        color=COLOR_RED,
                     )
-                    await interaction.response.edit_message(embed=embed, view=None)
+                    await interaction.edit_original_response(embed=embed, view=None)
                     return
 
                 embed = discord.Embed(
                     title="🔄 Choose a Hero to Continue",
                     description="\n".join(log) + "\nPick your next available hero:",
-                    color=discord.Color.blurple(),
+                    color=COLOR_BLURPLE,
                 )
                 for h in healthy:
                     embed.add_field(
@@ -1445,75 +1848,12 @@ class BattleView(discord.ui.View):
                         inline=False,
                     )
 
-                class AutoSwapView(discord.ui.View):
-                    def __init__(self, parent, heroes):
-                        super().__init__(timeout=30)
-                        self.parent = parent
-                        self.heroes = {x["unique_id"]: x for x in heroes}
-
-                        select = discord.ui.Select(
-                            placeholder="Select a hero...",
-                            min_values=1,
-                            max_values=1,
-                            options=[
-                                discord.SelectOption(
-                                    label=f"{x['name']} (Lv.{x['level']})",
-                                    description=f"HP: {x.get('current_hp', x['stats']['hp'])}/{x['stats']['hp']}",
-                                    value=x["unique_id"],
-                                )
-                                for x in heroes
-                            ],
-                        )
-                        select.callback = self.select_callback
-                        self.add_item(select)
-
-                    async def select_callback(self, interaction: discord.Interaction):
-                        hero_id = interaction.data["values"][0]
-                        chosen = self.heroes[hero_id]
-                        chosen.setdefault("current_hp", chosen["stats"]["hp"])
-                        self.parent.player_hero = chosen
-
-                        embed = discord.Embed(
-                            title=f"⚔️ Battle — {chosen['name']} vs {self.parent.enemy['name']}",
-                            description=f"You sent out {chosen['name']} (Lv.{chosen['level']}) to continue the fight!",
-                            color=discord.Color.orange(),
-                        )
-                        embed.add_field(name=f"{chosen['name']} HP",
-                                        value=f"{chosen['current_hp']}/{chosen['stats']['hp']}")
-                        embed.add_field(name=f"{self.parent.enemy['name']} HP",
-                                        value=f"{self.parent.enemy['current_hp']}/{self.parent.enemy['stats']['hp']}")
-
-                        new_view = BattleView(
-                            interaction,
-                            chosen,
-                            self.parent.enemy,
-                            self.parent.team,
-                            carry=self.parent._carry_state(),
-                            start_of_battle=False,
-                        )
-                        files = self.parent._get_sprites(embed)
-                        await interaction.response.edit_message(embed=embed, attachments=files, view=new_view)
-                        self.stop()
-
-                await interaction.response.edit_message(embed=embed, view=AutoSwapView(self, healthy))
+                view = SwapSelectView(self, healthy, "You sent out {name} (Lv.{level}) to continue the fight!")
+                await interaction.edit_original_response(embed=embed, view=view)
                 return
 
         # --- ongoing state (single edit) ---
-        embed = discord.Embed(
-            title=f"⚔️ Battle — {self.player_hero['name']} vs {self.enemy['name']}",
-            description="\n".join(log),
-            color=discord.Color.orange(),
-        )
-        embed.add_field(
-            name=f"{self.player_hero['name']} HP",
-            value=f"{self.player_hero['current_hp']}/{self.player_hero['stats']['hp']}",
-        )
-        embed.add_field(
-            name=f"{self.enemy['name']} HP",
-            value=f"{self.enemy['current_hp']}/{self.enemy['stats']['hp']}",
-        )
-        files = self._get_sprites(embed)
-        await interaction.response.edit_message(embed=embed, attachments=files, view=self)
+        await self._edit_battle(interaction, log, self)
 
     # -------------------------
     # Handle rewards
@@ -1522,19 +1862,7 @@ class BattleView(discord.ui.View):
         """Handles enemy defeat, XP, coins, drops, level ups, and boss logic (full version)."""
         if self.enemy["current_hp"] > 0:
             # Still alive, just update embed mid-battle
-            embed = discord.Embed(
-                title=f"⚔️ Battle — {self.player_hero['name']} vs {self.enemy['name']}",
-                description="\n".join(log),
-                color=discord.Color.orange()
-            )
-            embed.add_field(
-                name=f"{self.player_hero['name']} HP",
-                value=f"{self.player_hero['current_hp']}/{self.player_hero['stats']['hp']}")
-            embed.add_field(
-                name=f"{self.enemy['name']} HP",
-                value=f"{self.enemy['current_hp']}/{self.enemy['stats']['hp']}")
-            files = self._get_sprites(embed)
-            await interaction.response.edit_message(embed=embed, attachments=files, view=None)
+            await self._edit_battle(interaction, log, None)
             return
 
         next_enemy = None
@@ -1544,169 +1872,115 @@ class BattleView(discord.ui.View):
         # ---------------------------------
         # Boss domain (multi-phase battles)
         # ---------------------------------
-        bdata = players.get(self.user_id, {}).get("boss_battle")
+        p = players[self.user_id]
+        bdata = p.get("boss_battle")
         if bdata:
             btype = bdata["type"]
             bdata["index"] += 1
 
             if bdata["index"] >= len(bdata["team"]):
                 # Domain cleared!
-                badge_already = players[self.user_id]["badges"].get(btype, False)
+                badge_already = p["badges"].get(btype, False)
                 if badge_already:
                     boss_coins = int(random.triangular(5000, 10000, 8000))
-                    players[self.user_id]["coins"] += boss_coins
+                    p["coins"] += boss_coins
                     boss_msg = (
                         f"🏆 You defeated **{BOSS_LEADERS[btype]['name']}**, "
                         f"the ruler of the **{btype.capitalize()} Domain!** 👑"
                     )
                 else:
                     boss_coins = int(random.triangular(10000, 25000, 10000))
-                    players[self.user_id]["coins"] += boss_coins
-                    players[self.user_id]["badges"][btype] = True
+                    p["coins"] += boss_coins
+                    p["badges"][btype] = True
                     boss_msg = (
                         f"🏆 You conquered the **{btype.capitalize()} Domain** "
                         f"and earned the **{btype.capitalize()} Badge** 🎖️"
                     )
                 log.append(boss_msg)
 
-                del players[self.user_id]["boss_battle"]
-                players[self.user_id]["boss_victory"] = ""
+                del p["boss_battle"]
+                p["boss_victory"] = ""
             else:
                 next_enemy = bdata["team"][bdata["index"]]
 
         # ---------------------------------
         # Rewards (Coins / XP / Materials)
         # ---------------------------------
-        p = players[self.user_id]
-        p.setdefault("bag", {})
-
         rarity = self.enemy.get("rarity", "common").lower()
+        ri = RARITY_IDX.get(rarity, -1)
 
         # Coin rewards
-        rarity_rewards = {
-            "common": (50, 100),
-            "uncommon": (150, 250),
-            "rare": (250, 500),
-            "epic": (500, 1000),
-            "legendary": (1000, 5000),
-        }
-        low, high = rarity_rewards.get(rarity, (100, 200))
-        coin_reward = random.randint(low, high)
+        coin_reward = random.randint(*KO_COIN_RANGES[ri])
         level_bonus = self.enemy.get("level", 1) // 2
         ko_coins = coin_reward + level_bonus
 
         p["coins"] = p.get("coins", 0) + ko_coins
-        self.total_coins += ko_coins
-        self.reward_log.append(f"💰 +{ko_coins} coins from {self.enemy['name']}")
+        self.rewards.total_coins += ko_coins
+        self.rewards.reward_log.append(f"💰 +{ko_coins} coins from {self.enemy['name']}")
 
         # Hero XP
-        rarity_xp = {
-            "common": (200, 1500),
-            "uncommon": (1500, 3000),
-            "rare": (3000, 6000),
-            "epic": (6000, 12000),
-            "legendary": (15000, 30000),
-        }
-        xp_low, xp_high = rarity_xp.get(rarity, (5, 10))
-        hero_xp_gain = random.randint(xp_low, xp_high) + (self.enemy.get("level", 1) // 2)
+        hero_xp_gain = random.randint(*KO_HERO_XP_RANGES[ri]) + (self.enemy.get("level", 1) // 2)
         hero = self.player_hero
         if hero:
             if hero["level"] >= 100:
-                self.reward_log.append(f"{hero['name']} is maxed at Lv.100 and won’t gain XP 🔒")
+                self.rewards.reward_log.append(f"{hero['name']} is maxed at Lv.100 and won’t gain XP 🔒")
             else:
                 award_entity_xp(hero, hero_xp_gain, log, lambda e: hero_by_id.get(e["id"], {}).get("stats", {}))
-                self.total_hero_xp += hero_xp_gain
-                self.reward_log.append(f"⭐ {hero['name']} +{hero_xp_gain} XP")
+                self.rewards.total_hero_xp += hero_xp_gain
+                self.rewards.reward_log.append(f"⭐ {hero['name']} +{hero_xp_gain} XP")
 
         # Adventurer XP
-        xp_rewards = {
-            "common": (20, 40),
-            "uncommon": (40, 80),
-            "rare": (80, 160),
-            "epic": (160, 300),
-            "legendary": (1000, 2000),
-        }
-        trainer_xp_gain = random.randint(*xp_rewards.get(rarity, (5, 10)))
+        trainer_xp_gain = random.randint(*KO_TRAINER_XP_RANGES[ri])
         p["xp"] = p.get("xp", 0) + trainer_xp_gain
-        self.total_trainer_xp += trainer_xp_gain
+        self.rewards.total_trainer_xp += trainer_xp_gain
 
         # Handle adventurer level ups
         level_ups = []
-        while p["xp"] >= xp_required_for_level(p["level"]):
-            p["xp"] -= xp_required_for_level(p["level"])
-            p["level"] += 1
-            new_level = p["level"]
+        for new_level in range(advance_player_level(p) + 1, p["level"] + 1):
             coin_bonus = new_level * 200
             p["coins"] += coin_bonus
             msg = f"\n🎉 Congrats {p['username']}! You leveled up to Lv.{new_level}!\n💰 Reward: {coin_bonus} coins"
 
             if new_level < 10:
                 amt = random.randint(2, 5)
-                p["bag"]["Contract"] = p["bag"].get("Contract", 0) + amt
+                p["bag"]["Contract"] += amt
                 msg += f" + {amt} Contracts"
             elif new_level < 20:
                 amt = random.randint(2, 5)
-                p["bag"]["Great Contract"] = p["bag"].get("Great Contract", 0) + amt
+                p["bag"]["Great Contract"] += amt
                 msg += f" + {amt} Great Contracts"
             elif new_level < 50:
                 amt = random.randint(2, 5)
-                p["bag"]["Ancient Contract"] = p["bag"].get("Ancient Contract", 0) + amt
+                p["bag"]["Ancient Contract"] += amt
                 msg += f" + {amt} Ancient Contracts"
             if new_level in (10, 25, 50, 75, 100):
-                p["bag"]["Soulbound Contract"] = p["bag"].get("Soulbound Contract", 0) + 1
+                p["bag"]["Soulbound Contract"] += 1
                 msg += " + 1 Soulbound Contract"
             level_ups.append(msg)
 
         # ---------- Material drops (rarity-aware like Pokémon bot) ----------
-        drop_summary = {}
-
-        # Safe MATERIALS lookup
-        element_tables = {}
-        try:
-            if MATERIALS:
-                element_tables = {str(k).lower(): v for k, v in MATERIALS.items()}
-        except NameError:
-            element_tables = {}
+        drop_summary = Counter()
 
         # Pick element (normalize case)
-        fallback_ele = next(iter(element_tables.keys()), None)
-        enemy_ele = (self.enemy.get("element") or fallback_ele or "").lower()
-        element_drops = element_tables.get(enemy_ele, {})
-
-        # Rarity relationships
-        rarity_order = ["common", "uncommon", "rare", "epic", "legendary"]
-        enemy_rarity = self.enemy.get("rarity", "common").lower()
-        if enemy_rarity not in rarity_order:
-            enemy_rarity = "common"
-
-        # Weighted roll around enemy rarity
-        def get_adjacent_rarity():
-            idx = rarity_order.index(enemy_rarity)
-            roll = random.random()
-            if roll < 0.70:
-                # same rarity
-                return rarity_order[idx]
-            elif roll < 0.85:
-                # one tier higher (if possible)
-                return rarity_order[min(idx + 1, len(rarity_order) - 1)]
-            else:
-                # one tier lower (if possible)
-                return rarity_order[max(idx - 1, 0)]
+        enemy_ele = (self.enemy.get("element") or FALLBACK_ELEMENT or "").lower()
+        element_drops = MATERIALS_LC.get(enemy_ele, {})
+
+        # Weighted roll around enemy rarity (unknown rarities drop as common):
+        # 70% same tier, 15% one higher, 15% one lower (clamped)
+        idx = max(ri, 0)
+        weights = [0.0] * len(RARITIES)
+        weights[idx] += 0.70
+        weights[min(idx + 1, len(RARITIES) - 1)] += 0.15
+        weights[max(idx - 1, 0)] += 0.15
 
         # Number of items to drop
         num_drops = random.randint(1, 3)
 
-        for _ in range(num_drops):
-            chosen_rarity = get_adjacent_rarity()
-            pool = element_drops.get(chosen_rarity, [])
-
-            # Fallback if chosen rarity empty
-            if not pool:
-                all_items = []
-                for r in rarity_order:
-                    all_items.extend(element_drops.get(r, []))
-                pool = all_items
+        # Fallback pool for tiers this element has no drops in
+        flat_all = [d for r in RARITIES for d in element_drops.get(r, [])]
 
+        for chosen_rarity in random.choices(RARITIES, weights=weights, k=num_drops):
+            pool = element_drops.get(chosen_rarity) or flat_all
             if not pool:
                 continue
 
@@ -1718,57 +1992,53 @@ class BattleView(discord.ui.View):
                 or str(drop)
             )
 
-            # Add to bag
-            p.setdefault("bag", {})
-            p["bag"][item_name] = p["bag"].get(item_name, 0) + 1
-            drop_summary[item_name] = drop_summary.get(item_name, 0) + 1
+            drop_summary[item_name] += 1
 
-        # Log
+        # Add to bag and log, once per distinct item
+        bag = p["bag"]
         for item, count in drop_summary.items():
-            self.drop_summary[item] = self.drop_summary.get(item, 0) + count
-            self.reward_log.append(f"🎁 {count}x {item}")
+            bag_add(bag, item, count)
+            self.rewards.reward_log.append(f"🎁 {count}x {item}")
+        self.rewards.drop_summary.update(drop_summary)
 
-        await save_json(PLAYER_FILE, players)
+        mark_player_dirty(self.user_id)
 
         # ---------------------------------
         # Multi-phase boss transition
         # ---------------------------------
         if next_enemy:
-            carry = self._carry_state()
             new_view = BattleView(
                 interaction,
                 self.player_hero,
                 next_enemy,
                 self.team,
-                carry=carry,
+                carry=self.rewards,
                 start_of_battle=False,
             )
             desc_parts = [*log]
             if boss_msg:
                 desc_parts.append(boss_msg)
             desc_parts.append("🔥 Another foe appears!")
-            embed = discord.Embed(
-                title=f"⚔️ Boss Battle — {self.player_hero['name']} vs {next_enemy['name']}",
-                description="\n".join(desc_parts),
-                color=discord.Color.orange()
+            embed, files = new_view._render_battle(
+                desc_parts, title=f"⚔️ Boss Battle — {self.player_hero['name']} vs {next_enemy['name']}"
             )
-            files = new_view._get_sprites(embed)
-            await interaction.response.edit_message(embed=embed, attachments=files, view=None)
+            # The next phase rides on the same edit as this KO's log
+            await interaction.edit_original_response(embed=embed, attachments=files, view=new_view)
             return
 
         # ---------------------------------
         # Final victory summary
         # ---------------------------------
         summary_lines = [
-            f"💰 Coins: **{self.total_coins + boss_coins}**",
-            f"⭐ Adventurer XP: **{self.total_trainer_xp}**",
-            f"⭐ Hero XP: **{self.total_hero_xp}**",
+            f"💰 Coins: **{self.rewards.total_coins + boss_coins}**",
+            f"⭐ Adventurer XP: **{self.rewards.total_trainer_xp}**",
+            f"⭐ Hero XP: **{self.rewards.total_hero_xp}**",
         ]
-        for item, count in self.drop_summary.items():
+        for item, count in self.rewards.drop_summary.items():
             summary_lines.append(f"🎁 {count}x {item}")
 
         if boss_msg:
-            self.reward_log.append(boss_msg)
+            self.rewards.reward_log.append(boss_msg)
 
         respawn_orb = p.get("respawn_orb")
         if respawn_orb:
@@ -1778,32 +2048,25 @@ class BattleView(discord.ui.View):
             if kills >= goal:
                 filled_name = f"Filled {respawn_orb['item']}"
                 base_name = respawn_orb["item"].lower()
-                if base_name in p["bag"]:
-                    p["bag"][base_name] -= 1
-                    if p["bag"][base_name] <= 0:
-                        del p["bag"][base_name]
-                p["bag"][filled_name.lower()] = p["bag"].get(filled_name.lower(), 0) + 1
+                bag_consume(p["bag"], base_name)
+                p["bag"][filled_name.lower()] += 1
                 del p["respawn_orb"]
                 summary_lines.append(f"✨ Your {filled_name} is complete! You can now summon {respawn_orb['name']}\n")
             else:
                 summary_lines.append(f"⚡ {kills}/{goal} souls absorbed into {respawn_orb['item']}...\n")
-            await save_json(PLAYER_FILE, players)
+            mark_player_dirty(self.user_id)
 
         embed = discord.Embed(
             title="🎉 Victory",
             description="\n".join(log),
-            color=discord.Color.green()
+            color=COLOR_GREEN
         )
         embed.add_field(name="Rewards", value="\n".join(summary_lines), inline=False)
 
         if level_ups:
             embed.add_field(name="Level Ups!", value="".join(level_ups), inline=False)
 
-        files = []
-        if not interaction.response.is_done():
-            await interaction.response.edit_message(embed=embed, attachments=files, view=None)
-        else:
-            await interaction.response.edit_message(embed=embed, attachments=files, view=None)
+        await interaction.edit_original_response(embed=embed, attachments=[], view=None)
 
 # -----------------------------
 # PROFILE
@@ -1821,6 +2084,7 @@ async def profile(interaction: discord.Interaction, user: discord.User | None =
         if target_user == interaction.user:
             players[user_id] = {
                 "username": target_user.name,
+                "display_name": target_user.global_name or target_user.name,
                 "coins": 20000,
                 "xp": 0,
                 "level": 1,
@@ -1830,7 +2094,7 @@ async def profile(interaction: discord.Interaction, user: discord.User | None =
                 "active_team": [],
                 "codex": []
             }
-            await save_json(PLAYER_FILE, players)
+            prepare_player(players[user_id])
 
             view = StarterSelectView(user_id)
             await interaction.response.send_message(
@@ -1838,6 +2102,8 @@ async def profile(interaction: discord.Interaction, user: discord.User | None =
                 view=view,
                 ephemeral=True
             )
+            # New profiles go to disk right away, after the reply so creation isn't slowed
+            await flush_player(user_id)
             return
         else:
             await interaction.response.send_message(
@@ -1889,8 +2155,9 @@ async def profile(interaction: discord.Interaction, user: discord.User | None =
     # Active Party
     if p["active_team"]:
         heroes = []
+        pc_index = p["_pc_index"]
         for i, hid in enumerate(p["active_team"], 1):
-            h = next((x for x in p["pc"] if x["unique_id"] == hid), None)
+            h = pc_index.get(hid)
             if h:
                 rarity = h['rarity'].capitalize()
                 shiny_star = "✨ " if h.get("shiny") else ""
@@ -1913,14 +2180,30 @@ async def leaderboard(interaction: discord.Interaction):
         await interaction.response.send_message("Nobody has any coins yet.")
         return
 
-    # Sort by player coins
-    top10 = sorted(players.items(), key=lambda x: x[1]["coins"], reverse=True)[:10]
+    # Only the top 10 are needed, so a partial sort beats sorting every player
+    top10 = heapq.nlargest(10, players.items(), key=lambda x: x[1]["coins"])
+
+    async def resolve(uid, pdata):
+        # Names are stored on the player by on_interaction; only fall back to Discord without one
+        name = pdata.get("display_name")
+        if name:
+            return name
+        user = interaction.client.get_user(int(uid))
+        if not user:
+            try:
+                user = await interaction.client.fetch_user(int(uid))
+            except discord.HTTPException:
+                user = None
+        if user:
+            return user.display_name
+        return pdata.get("username") or f"User {uid}"
+
+    # Players without a stored name each need an API round trip; fetch them concurrently
+    names = await asyncio.gather(*(resolve(uid, pdata) for uid, pdata in top10))
 
     lines = []
-    for i, (uid, pdata) in enumerate(top10, start=1):
+    for i, ((uid, pdata), name) in enumerate(zip(top10, names), start=1):
         bal = pdata["coins"]
-        user = interaction.client.get_user(int(uid)) or await interaction.client.fetch_user(int(uid))
-        name = user.display_name if user else f"User {uid}"
         lines.append(f"**{i}.** {name} — 💰 {bal}")
 
     embed = discord.Embed(
@@ -1942,13 +2225,8 @@ async def bag(interaction: discord.Interaction):
         await interaction.response.send_message("🎒 Your bag is empty!", ephemeral=True)
         return
 
-    # Load items.json dynamically
-    with open(ITEMS_FILE, "r", encoding="utf-8") as f:
-        items_data = json.load(f)
-
-    CONSUMABLES = {i["name"]: i for i in items_data["consumables"]}
-    KEYS = {i["name"]: i for i in items_data["keys"]}
-    MATERIALS = items_data["materials"]
+    # items.json, cached until the file changes
+    item_index = get_items()["index"]
 
     embed = discord.Embed(
         title=f"🎒 {p['username']}'s Inventory",
@@ -1956,18 +2234,25 @@ async def bag(interaction: discord.Interaction):
         color=discord.Color.blurple()
     )
 
+    # One pass over the bag, sorting each entry into its section
+    key_lines, cons_lines, materials, misc_items = [], [], [], []
+    for name, qty in bag.items():
+        section, detail = item_index.get(name, ("misc", None))
+        if section == "key":
+            key_lines.append(f"**{name}** ×{qty} — *{detail['effect']}*")
+        elif section == "cons":
+            cons_lines.append(f"**{name}** ×{qty} — *{detail['effect']}*")
+        elif section == "material":
+            if qty > 0:
+                materials.append((*detail, name, qty))
+        else:
+            misc_items.append(f"**{name}** ×{qty}")
+
     # --- Keys ---
-    key_lines = [
-        f"**{name}** ×{bag[name]} — *{KEYS[name]['effect']}*" for name in bag.keys() if name in KEYS
-    ]
     if key_lines:
         embed.add_field(name="🗝️ Keys", value="\n".join(key_lines), inline=False)
 
     # --- Consumables ---
-    cons_lines = [
-        f"**{name}** ×{bag[name]} — *{CONSUMABLES[name]['effect']}*"
-        for name in bag.keys() if name in CONSUMABLES
-    ]
     if cons_lines:
         embed.add_field(name="🧴 Consumables", value="\n".join(cons_lines), inline=False)
 
@@ -1978,32 +2263,17 @@ async def bag(interaction: discord.Interaction):
         "nature": "🌿", "arcane": "🔮"
     }
 
-    for element, rarities in MATERIALS.items():
-        found = []
-        for rarity, mats in rarities.items():
-            for m in mats:
-                qty = bag.get(m["name"], 0)
-                if qty > 0:
-                    found.append(f"• {m['name']} ×{qty} ({rarity.title()})")
-        if found:
-            icon = element_icons.get(element, "✨")
-            embed.add_field(
-                name=f"{icon} {element.title()} Materials",
-                value="\n".join(found),
-                inline=False
-            )
+    materials.sort()  # catalogue order, so each element's materials are contiguous
+    for element, group in groupby(materials, key=lambda m: m[1]):
+        found = [f"• {name} ×{qty} ({rarity.title()})" for _, _, rarity, name, qty in group]
+        icon = element_icons.get(element, "✨")
+        embed.add_field(
+            name=f"{icon} {element.title()} Materials",
+            value="\n".join(found),
+            inline=False
+        )
 
     # --- Misc Items ---
-    known_items = set(CONSUMABLES.keys()) | set(KEYS.keys())
-    for element, rarities in MATERIALS.items():
-        for rarity, mats in rarities.items():
-            known_items.update([m["name"] for m in mats])
-
-    misc_items = [
-        f"**{k}** ×{v}"
-        for k, v in bag.items()
-        if k not in known_items
-    ]
     if misc_items:
         embed.add_field(name="📦 Other Items", value="\n".join(misc_items), inline=False)
 
@@ -2050,8 +2320,9 @@ async def party(interaction: discord.Interaction):
         return
 
     heroes = []
+    pc_index = p["_pc_index"]
     for i, hid in enumerate(p["active_team"], 1):
-        h = next((x for x in p["pc"] if x["unique_id"] == hid), None)
+        h = pc_index.get(hid)
         if h:
             shiny = "✨" if h.get("shiny") else ""
             locked = "🔒" if h.get("locked") else ""
@@ -2086,8 +2357,9 @@ async def team(interaction: discord.Interaction):
         return
 
     heroes = []
+    pc_index = p["_pc_index"]
     for i, hid in enumerate(p["active_team"], 1):
-        h = next((x for x in p["pc"] if x["unique_id"] == hid), None)
+        h = pc_index.get(hid)
         if h:
             shiny = "✨" if h.get("shiny") else ""
             locked = "🔒" if h.get("locked") else ""
@@ -2163,10 +2435,9 @@ async def hero(interaction: discord.Interaction, id: str):
     if id.isdigit():
         slot = int(id)
         if 1 <= slot <= len(p.get("active_team", [])):
-            hero_id = p["active_team"][slot - 1]
-            hero = next((h for h in p["pc"] if h["unique_id"] == hero_id), None)
+            hero = p["_pc_index"].get(p["active_team"][slot - 1])
     else:
-        hero = next((h for h in p["pc"] if h["unique_id"].lower().startswith(id.lower())), None)
+        hero = find_hero(p, id)
 
     if not hero:
         await interaction.response.send_message(f"❌ No hero found matching `{id}`.", ephemeral=True)
@@ -2205,9 +2476,10 @@ async def hero(interaction: discord.Interaction, id: str):
     embed.set_footer(text=f"ID: {hero['unique_id']} | {''.join(hero.get('element', []))} | {rarity}")
 
     # Include sprite if available
-    if hero.get("sprite") and os.path.exists(hero["sprite"]):
-        file = discord.File(hero["sprite"], filename="sprite.png")
-        embed.set_thumbnail(url="attachment://sprite.png")
+    url, file = sprite_ref(hero.get("sprite"), "sprite.png")
+    if url:
+        embed.set_thumbnail(url=url)
+    if file:
         await interaction.response.send_message(embed=embed, file=file, ephemeral=True)
     else:
         await interaction.response.send_message(embed=embed, ephemeral=True)
@@ -2227,9 +2499,7 @@ async def elixir(interaction: discord.Interaction, identifier: str, amount: int
         await interaction.response.send_message("❌ You don’t have any items yet.", ephemeral=True)
         return
 
-    # Case-insensitive bag lookup
-    bag = {k.lower(): v for k, v in p["bag"].items()}
-    elixirs = bag.get("elixir", 0)
+    elixirs = p["bag"]["elixir"]
     if elixirs <= 0:
         await interaction.response.send_message("❌ You have no Elixirs! Buy some from the shop.", ephemeral=True)
         return
@@ -2239,9 +2509,9 @@ async def elixir(interaction: discord.Interaction, identifier: str, amount: int
     if identifier.isdigit():
         slot = int(identifier)
         if 1 <= slot <= len(p.get("active_team", [])):
-            hero = next((h for h in p["pc"] if h["unique_id"] == p["active_team"][slot - 1]), None)
+            hero = p["_pc_index"].get(p["active_team"][slot - 1])
     else:
-        hero = next((h for h in p["pc"] if h["unique_id"].lower().startswith(identifier.lower())), None)
+        hero = find_hero(p, identifier)
 
     if not hero:
         await interaction.response.send_message(f"❌ No hero found matching `{identifier}`.", ephemeral=True)
@@ -2258,13 +2528,8 @@ async def elixir(interaction: discord.Interaction, identifier: str, amount: int
         await interaction.response.send_message("⚠️ You can’t use that many Elixirs!", ephemeral=True)
         return
 
-    # Deduct Elixirs (case-insensitive)
-    for key in list(p["bag"].keys()):
-        if key.lower() == "elixir":
-            p["bag"][key] -= max_usable
-            if p["bag"][key] <= 0:
-                del p["bag"][key]
-            break
+    # Deduct Elixirs
+    bag_consume(p["bag"], "elixir", max_usable)
 
     # Level up hero
     hero["level"] += max_usable
@@ -2272,7 +2537,7 @@ async def elixir(interaction: discord.Interaction, identifier: str, amount: int
         hero["_base_stats"] = hero.get("stats", {}).copy()
     recalc_stats_from_base(hero, hero["_base_stats"])
 
-    await save_json(PLAYER_FILE, players)
+    mark_player_dirty(user_id)
 
     embed = discord.Embed(
         title="🧪 Elixir Used!",
@@ -2305,37 +2570,31 @@ async def heal(interaction: discord.Interaction):
         await interaction.response.send_message("⚠️ You have no active heroes to heal!", ephemeral=True)
         return
 
-    # Case-insensitive potion check
-    bag = {k.lower(): v for k, v in p.get("bag", {}).items()}
-    potions = bag.get("potion", 0)
+    potions = p["bag"]["potion"]
     if potions <= 0:
         await interaction.response.send_message("❌ You have no Potions! Buy them from the shop.", ephemeral=True)
         return
 
     # Heal all active team members
-    team_ids = p["active_team"]
+    pc_index = p["_pc_index"]
     healed = []
-    for hero in p["pc"]:
-        if hero["unique_id"] in team_ids:
-            cur_hp = hero.get("current_hp", hero["stats"]["hp"])
-            max_hp = hero["stats"]["hp"]
-            if cur_hp < max_hp:
-                hero["current_hp"] = max_hp
-                healed.append(hero["name"])
+    for hero_id in p["active_team"]:
+        hero = pc_index.get(hero_id)
+        if not hero:
+            continue
+        max_hp = hero["stats"]["hp"]
+        if hero.get("current_hp", max_hp) < max_hp:
+            hero["current_hp"] = max_hp
+            healed.append(hero["name"])
 
     if not healed:
         await interaction.response.send_message("💤 All your heroes are already at full HP!", ephemeral=True)
         return
 
     # Consume one potion (you can make it cost more later)
-    for key in list(p["bag"].keys()):
-        if key.lower() == "potion":
-            p["bag"][key] -= 1
-            if p["bag"][key] <= 0:
-                del p["bag"][key]
-            break
+    bag_consume(p["bag"], "potion")
 
-    await save_json(PLAYER_FILE, players)
+    mark_player_dirty(user_id)
 
     embed = discord.Embed(
         title="💖 Party Healed!",
@@ -2364,10 +2623,6 @@ async def move(interaction: discord.Interaction, from_slot: int, to_slot: int):
         await interaction.response.send_message("⚠️ Create a profile first with `/profile`.", ephemeral=True)
         return
 
-    if user_id not in players:
-        await interaction.response.send_message("⚠️ Create a profile with `/profile` first.", ephemeral=True)
-        return
-
     p = players[user_id]
     team = p.get("active_team", [])
 
@@ -2393,8 +2648,8 @@ async def move(interaction: discord.Interaction, from_slot: int, to_slot: int):
     # Swap (0-indexed)
     hero_a_id = team[from_slot - 1]
     hero_b_id = team[to_slot - 1]
-    hero_a = next((h for h in p["pc"] if h["unique_id"] == hero_a_id), None)
-    hero_b = next((h for h in p["pc"] if h["unique_id"] == hero_b_id), None)
+    hero_a = p["_pc_index"].get(hero_a_id)
+    hero_b = p["_pc_index"].get(hero_b_id)
 
     if (hero_a and hero_a.get("locked")) or (hero_b and hero_b.get("locked")):
         await interaction.response.send_message(
@@ -2404,15 +2659,14 @@ async def move(interaction: discord.Interaction, from_slot: int, to_slot: int):
 
     team[from_slot - 1], team[to_slot - 1] = team[to_slot - 1], team[from_slot - 1]
 
-    await save_json(PLAYER_FILE, players)
+    mark_player_dirty(user_id)
 
     await interaction.response.send_message(
         f"✅ Swapped slot {from_slot} with slot {to_slot}.",
         ephemeral=True)
 
-@bot.tree.command(name="partyadd", description="Add a hero from your barracks to your active party")
-@app_commands.describe(id="Hero ID to add to your party (e.g. h6d21)")
-async def partyadd(interaction: discord.Interaction, id: str):
+async def party_add(interaction: discord.Interaction, id: str):
+    """Shared body of /partyadd and /teamadd."""
     user_id = str(interaction.user.id)
     if user_id not in players:
         await interaction.response.send_message("⚠️ Create a profile first with `/profile`.", ephemeral=True)
@@ -2423,7 +2677,7 @@ async def partyadd(interaction: discord.Interaction, id: str):
         await interaction.response.send_message("❌ You don't have any heroes in your barracks.", ephemeral=True)
         return
 
-    hero = next((h for h in p["pc"] if h["unique_id"].lower().startswith(id.lower())), None)
+    hero = find_hero(p, id)
     if not hero:
         await interaction.response.send_message(f"❌ No hero found with ID `{id}`.", ephemeral=True)
         return
@@ -2437,15 +2691,14 @@ async def partyadd(interaction: discord.Interaction, id: str):
         return
 
     p["active_team"].append(hero["unique_id"])
-    await save_json(PLAYER_FILE, players)
+    mark_player_dirty(user_id)
     await interaction.response.send_message(
         f"✅ Added **{hero['name']}** (Lv.{hero['level']}) to your party! (`{hero['unique_id']}`)",
         ephemeral=True
     )
 
-@bot.tree.command(name="partyremove", description="Remove a hero from your active party by ID or slot number")
-@app_commands.describe(identifier="Hero ID (e.g. hfaf4) or slot number (1-6)")
-async def partyremove(interaction: discord.Interaction, identifier: str):
+async def party_remove(interaction: discord.Interaction, identifier: str):
+    """Shared body of /partyremove and /teamremove."""
     user_id = str(interaction.user.id)
     if user_id not in players:
         await interaction.response.send_message("⚠️ Create a profile first with `/profile`.", ephemeral=True)
@@ -2463,10 +2716,11 @@ async def partyremove(interaction: discord.Interaction, identifier: str):
     if identifier.isdigit():
         slot = int(identifier)
         if 1 <= slot <= len(team):
-            hero = next((h for h in p["pc"] if h["unique_id"] == team[slot - 1]), None)
+            hero = p["_pc_index"].get(team[slot - 1])
     else:
-        # Otherwise, treat as hero ID
-        hero = next((h for h in p["pc"] if h["unique_id"].lower().startswith(identifier.lower()) and h["unique_id"] in team), None)
+        # Otherwise, treat as hero ID; only party members can match, so search the party rather than the barracks
+        prefix = identifier.lower()
+        hero = next((p["_pc_index"][uid] for uid in team if uid.lower().startswith(prefix) and uid in p["_pc_index"]), None)
 
     if not hero:
         await interaction.response.send_message(f"❌ No hero found matching `{identifier}` in your party.", ephemeral=True)
@@ -2479,86 +2733,31 @@ async def partyremove(interaction: discord.Interaction, identifier: str):
         return
     
     p["active_team"].remove(hero["unique_id"])
-    await save_json(PLAYER_FILE, players)
+    mark_player_dirty(user_id)
     await interaction.response.send_message(
         f"🗑️ Removed **{hero['name']}** (Lv.{hero['level']}) from your party. (`{hero['unique_id']}`)",
         ephemeral=True
     )
 
-@bot.tree.command(name="teamadd", description="Add a hero from your barracks to your active party")
+@bot.tree.command(name="partyadd", description="Add a hero from your barracks to your active party")
 @app_commands.describe(id="Hero ID to add to your party (e.g. h6d21)")
-async def teamadd(interaction: discord.Interaction, id: str):
-    user_id = str(interaction.user.id)
-    if user_id not in players:
-        await interaction.response.send_message("⚠️ Create a profile first with `/profile`.", ephemeral=True)
-        return
-    p = players.get(user_id)
-
-    if not p or not p.get("pc"):
-        await interaction.response.send_message("❌ You don't have any heroes in your barracks.", ephemeral=True)
-        return
-
-    hero = next((h for h in p["pc"] if h["unique_id"].lower().startswith(id.lower())), None)
-    if not hero:
-        await interaction.response.send_message(f"❌ No hero found with ID `{id}`.", ephemeral=True)
-        return
-
-    if hero["unique_id"] in p["active_team"]:
-        await interaction.response.send_message("⚠️ That hero is already in your party.", ephemeral=True)
-        return
+async def partyadd(interaction: discord.Interaction, id: str):
+    await party_add(interaction, id)
 
-    if len(p["active_team"]) >= 6:
-        await interaction.response.send_message("⚠️ Your party is full (max 6 heroes).", ephemeral=True)
-        return
+@bot.tree.command(name="partyremove", description="Remove a hero from your active party by ID or slot number")
+@app_commands.describe(identifier="Hero ID (e.g. hfaf4) or slot number (1-6)")
+async def partyremove(interaction: discord.Interaction, identifier: str):
+    await party_remove(interaction, identifier)
 
-    p["active_team"].append(hero["unique_id"])
-    await save_json(PLAYER_FILE, players)
-    await interaction.response.send_message(
-        f"✅ Added **{hero['name']}** (Lv.{hero['level']}) to your party! (`{hero['unique_id']}`)",
-        ephemeral=True
-    )
+@bot.tree.command(name="teamadd", description="Add a hero from your barracks to your active party")
+@app_commands.describe(id="Hero ID to add to your party (e.g. h6d21)")
+async def teamadd(interaction: discord.Interaction, id: str):
+    await party_add(interaction, id)
 
 @bot.tree.command(name="teamremove", description="Remove a hero from your active party by ID or slot number")
 @app_commands.describe(identifier="Hero ID (e.g. hfaf4) or slot number (1-6)")
 async def teamremove(interaction: discord.Interaction, identifier: str):
-    user_id = str(interaction.user.id)
-    if user_id not in players:
-        await interaction.response.send_message("⚠️ Create a profile first with `/profile`.", ephemeral=True)
-        return
-    p = players.get(user_id)
-    
-    if not p or not p.get("active_team"):
-        await interaction.response.send_message("👥 You have no active heroes to remove.", ephemeral=True)
-        return
-
-    team = p["active_team"]
-    hero = None
-
-    # Check if input is a slot number
-    if identifier.isdigit():
-        slot = int(identifier)
-        if 1 <= slot <= len(team):
-            hero = next((h for h in p["pc"] if h["unique_id"] == team[slot - 1]), None)
-    else:
-        # Otherwise, treat as hero ID
-        hero = next((h for h in p["pc"] if h["unique_id"].lower().startswith(identifier.lower()) and h["unique_id"] in team), None)
-
-    if not hero:
-        await interaction.response.send_message(f"❌ No hero found matching `{identifier}` in your party.", ephemeral=True)
-        return
-
-    if hero.get("locked"):
-        await interaction.response.send_message(
-            f"🔒 **{hero['name']}** is locked and cannot be removed from your party.",
-            ephemeral=True)
-        return
-    
-    p["active_team"].remove(hero["unique_id"])
-    await save_json(PLAYER_FILE, players)
-    await interaction.response.send_message(
-        f"🗑️ Removed **{hero['name']}** (Lv.{hero['level']}) from your party. (`{hero['unique_id']}`)",
-        ephemeral=True
-    )
+    await party_remove(interaction, identifier)
 
 @bot.tree.command(name="lock", description="Lock a hero so they cannot be cleared or sold")
 @app_commands.describe(identifier="Hero ID (e.g. hf04f) or slot number (1-6)")
@@ -2576,16 +2775,16 @@ async def lock(interaction: discord.Interaction, identifier: str):
     if identifier.isdigit():
         slot = int(identifier)
         if 1 <= slot <= len(p["active_team"]):
-            hero = next((h for h in p["pc"] if h["unique_id"] == p["active_team"][slot - 1]), None)
+            hero = p["_pc_index"].get(p["active_team"][slot - 1])
     else:
-        hero = next((h for h in p["pc"] if h["unique_id"].lower().startswith(identifier.lower())), None)
+        hero = find_hero(p, identifier)
 
     if not hero:
         await interaction.response.send_message(f"❌ No hero found matching `{identifier}`.", ephemeral=True)
         return
 
     hero["locked"] = True
-    await save_json(PLAYER_FILE, players)
+    mark_player_dirty(user_id)
     await interaction.response.send_message(
         f"🔒 **{hero['name']}** (`{hero['unique_id']}`) is now locked and safe from deletion.",
         ephemeral=True)
@@ -2606,16 +2805,16 @@ async def unlock(interaction: discord.Interaction, identifier: str):
     if identifier.isdigit():
         slot = int(identifier)
         if 1 <= slot <= len(p["active_team"]):
-            hero = next((h for h in p["pc"] if h["unique_id"] == p["active_team"][slot - 1]), None)
+            hero = p["_pc_index"].get(p["active_team"][slot - 1])
     else:
-        hero = next((h for h in p["pc"] if h["unique_id"].lower().startswith(identifier.lower())), None)
+        hero = find_hero(p, identifier)
 
     if not hero:
         await interaction.response.send_message(f"❌ No hero found matching `{identifier}`.", ephemeral=True)
         return
 
     hero["locked"] = False
-    await save_json(PLAYER_FILE, players)
+    mark_player_dirty(user_id)
     await interaction.response.send_message(
         f"🔓 **{hero['name']}** (`{hero['unique_id']}`) is now unlocked.",
         ephemeral=True)
@@ -2665,14 +2864,16 @@ BOSS_LEADERS = {
 
 BOSS_COOLDOWN_HOURS = 12
 
+# BOSS_LEADERS never changes at runtime, so /bosses reuses one rendered list
+BOSSES_DESCRIPTION = "\n".join(
+    f"{data['emoji']} **{data['name']}** — {btype.capitalize()} Domain" for btype, data in BOSS_LEADERS.items()
+)
+
 @bot.tree.command(name="bosses", description="View all available Bosses")
 async def bosses(interaction: discord.Interaction):
-    lines = []
-    for btype, data in BOSS_LEADERS.items():
-        lines.append(f"{data['emoji']} **{data['name']}** — {btype.capitalize()} Domain")
     embed = discord.Embed(
         title="🏰 Boss Domains",
-        description="\n".join(lines),
+        description=BOSSES_DESCRIPTION,
         color=discord.Color.gold()
     )
     embed.set_footer(text="Use /boss name:<type> to challenge one!")
@@ -2694,64 +2895,57 @@ async def boss(interaction: discord.Interaction, name: str):
         await interaction.response.send_message("⚠️ Create a profile first with `/profile`.", ephemeral=True)
         return
     
-    p = players.setdefault(user_id, {})
-    p.setdefault("boss_cooldowns", {})
+    p = players[user_id]
 
     # Cooldown
-    now = datetime.now(timezone.utc)
     last = p["boss_cooldowns"].get(btype)
     if last:
-        last = datetime.fromisoformat(last)
-        remaining = (last + timedelta(hours=BOSS_COOLDOWN_HOURS)) - now
-        if remaining.total_seconds() > 0:
-            hrs, mins = divmod(int(remaining.total_seconds()) // 60, 60)
+        remaining = last + BOSS_COOLDOWN_HOURS * 3600 - time.time()
+        if remaining > 0:
+            hrs, mins = divmod(int(remaining) // 60, 60)
             await interaction.response.send_message(
                 f"⏳ You must wait **{hrs}h {mins}m** before fighting {btype.capitalize()} again.",
                 ephemeral=True
             )
             return
 
+    # Validate the party before building the boss team, so a failed check leaves no boss_battle behind
+    if not p.get("active_team"):
+        await interaction.response.send_message("⚠️ You need at least one hero in your team to fight!", ephemeral=True)
+        return
+
+    lead_id = p["active_team"][0]
+    lead = p["_pc_index"].get(lead_id)
+    if not lead:
+        await interaction.response.send_message("❌ Could not find your lead hero.", ephemeral=True)
+        return
+
     leader = BOSS_LEADERS[btype]
 
     # Pull monsters of this element
-    valid = [m for m in monsters_db if btype.capitalize() in m.get("types", []) or btype.lower() in [t.lower() for t in m.get("types", [])]]
+    valid = MONSTERS_BY_TYPE.get(btype, [])
     if len(valid) < 3:
         await interaction.response.send_message(f"⚠️ Not enough monsters for `{btype}` boss.", ephemeral=True)
         return
 
-    # Generate 3-6 monsters for this boss battle
-    chosen = random.sample(valid, random.randint(3, 6))
-    boss_team = []
-    for template in chosen:
-        lvl = int(random.triangular(35, 60, 45))
-        inst = build_instance_from_template(template, level=lvl)
-        boss_team.append(inst)
+    # Generate 3-6 monsters for this boss battle (never more than the pool holds)
+    chosen = random.sample(valid, random.randint(3, min(6, len(valid))))
+    triangular = random.triangular
+    boss_team = [build_instance_from_template(template, level=int(triangular(35, 60, 45))) for template in chosen]
 
-    players[user_id]["boss_battle"] = {
+    p["boss_battle"] = {
         "type": btype,
         "team": boss_team,
         "index": 0
     }
-    await save_json(PLAYER_FILE, players)
-
-    if not p.get("active_team"):
-        await interaction.response.send_message("⚠️ You need at least one hero in your team to fight!", ephemeral=True)
-        return
-
-    lead_id = p["active_team"][0]
-    lead = next((h for h in p["pc"] if h["unique_id"] == lead_id), None)
-    if not lead:
-        await interaction.response.send_message("❌ Could not find your lead hero.", ephemeral=True)
-        return
+    mark_player_dirty(user_id)
 
     enemy = boss_team[0]
     embed = discord.Embed(
         title=f"🏰 {leader['name']} — {btype.capitalize()} Domain",
-        description=f"Your {lead['name']} faces {leader['name']}'s {enemy['name']}!",
+        description=f"Your {lead['name']} faces {leader['name']}'s {enemy['name']}!\n\n{hp_lines(lead, enemy)}",
         color=discord.Color.orange()
     )
-    embed.add_field(name=f"{lead['name']} HP", value=lead["stats"]["hp"])
-    embed.add_field(name=f"{enemy['name']} HP", value=enemy["stats"]["hp"])
 
     view = BattleView(interaction, lead, enemy, p["active_team"], start_of_battle=True)
     files = view._get_sprites(embed)
@@ -2788,7 +2982,7 @@ async def show_auctionhouse(interaction: discord.Interaction, search: str = None
     for auc_id, auc in items[:10]:
         seller_name = players.get(auc["seller"], {}).get("username", "Unknown")
         try:
-            end_ts = int(datetime.fromisoformat(auc["end_time"]).timestamp())
+            end_ts = int(auction_end_ts(auc))
             end_str = f"⏳ Ends <t:{end_ts}:R>"
         except Exception:
             end_str = "⏳ End time unknown"
@@ -2815,6 +3009,12 @@ async def ah(interaction: discord.Interaction, search: str = None):
 # SHOP COMMANDS
 # -----------------------------
 
+# Shop stock is the static consumables and keys tables; each field is rendered once
+SHOP_FIELDS = tuple(
+    (f"🧾 {item['name']}", f"{item['effect']} — 💰 {item['price']} coins")
+    for item in chain(CONSUMABLES.values(), KEYS.values())
+)
+
 @bot.tree.command(name="shop", description="View the Adventurer Shop")
 async def shop(interaction: discord.Interaction):
     embed = discord.Embed(
@@ -2822,12 +3022,8 @@ async def shop(interaction: discord.Interaction):
         description="Buy consumables and keys with `/purchase name:<item> amount:<x>`",
         color=discord.Color.gold()
     )
-    for item in list(CONSUMABLES.values()) + list(KEYS.values()):
-        embed.add_field(
-            name=f"🧾 {item['name']}",
-            value=f"{item['effect']} — 💰 {item['price']} coins",
-            inline=False
-        )
+    for name, value in SHOP_FIELDS:
+        embed.add_field(name=name, value=value, inline=False)
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
 @bot.tree.command(name="purchase", description="Buy an item from the shop")
@@ -2854,8 +3050,8 @@ async def purchase(interaction: discord.Interaction, name: str, amount: int):
         return
 
     p["coins"] -= cost
-    p["bag"][item["name"]] = p["bag"].get(item["name"], 0) + amount
-    await save_json(PLAYER_FILE, players)
+    p["bag"][item["name"]] += amount
+    mark_player_dirty(user_id)
 
     await interaction.response.send_message(
         f"✅ Purchased {amount}x **{item['name']}** for 💰{cost} coins.\n💰 New Balance: {p['coins']}",
@@ -2874,16 +3070,9 @@ async def sell(interaction: discord.Interaction, item: str, amount: int):
     bag = p.get("bag", {})
     query = item.lower()
 
-    # ✅ Collect all sellable items from the ITEMS.json structure
-    all_items = []
-
-    # Materials
-    for elem_data in MATERIALS.values():
-        for rarity_list in elem_data.values():
-            all_items.extend(rarity_list)
-
-    # Find matching item
-    matches = [d for d in all_items if query in d["name"].lower()]
+    # Find matching item: an exact name wins, otherwise any name containing the query
+    exact = SELLABLE_BY_NAME.get(query)
+    matches = [exact] if exact else [d for name, d in SELLABLE_ITEMS if query in name]
     if not matches:
         await interaction.response.send_message(f"❌ No sellable item found matching '{item}'.", ephemeral=True)
         return
@@ -2901,18 +3090,14 @@ async def sell(interaction: discord.Interaction, item: str, amount: int):
         await interaction.response.send_message(f"❌ {name} cannot be sold!", ephemeral=True)
         return
 
-    actual_key = next((k for k in bag.keys() if k.lower() == name.lower()), None)
-    if not actual_key or bag[actual_key] < amount:
+    if not bag_consume(bag, name, amount):
         await interaction.response.send_message(f"❌ You don’t have {amount}x {name}.", ephemeral=True)
         return
 
     # Process sale
     earned = price * amount
-    bag[actual_key] -= amount
-    if bag[actual_key] <= 0:
-        del bag[actual_key]
     p["coins"] += earned
-    await save_json(PLAYER_FILE, players)
+    mark_player_dirty(user_id)
 
     await interaction.response.send_message(
         f"✅ Sold {amount}x **{name}** for 💰 {earned} coins!\n💰 New Balance: {p['coins']}",
@@ -2932,18 +3117,12 @@ async def sellall(interaction: discord.Interaction):
         await interaction.response.send_message("🎒 Your bag is empty!", ephemeral=True)
         return
 
-    # ✅ Build full sellable item list
-    all_items = []
-    for elem_data in MATERIALS.values():
-        for rarity_list in elem_data.values():
-            all_items.extend(rarity_list)
-
     total_earned = 0
     sold = []
     skipped = []
 
     for key, qty in list(bag.items()):
-        match = next((d for d in all_items if d["name"].lower() == key.lower()), None)
+        match = SELLABLE_BY_NAME.get(key.lower())
         if not match:
             skipped.append(key)
             continue
@@ -2960,7 +3139,7 @@ async def sellall(interaction: discord.Interaction):
 
     if total_earned > 0:
         p["coins"] += total_earned
-        await save_json(PLAYER_FILE, players)
+        mark_player_dirty(user_id)
 
     lines = []
     if sold:
@@ -2980,7 +3159,8 @@ async def sellall(interaction: discord.Interaction):
 # -----------------------------
 
 last_work_time = {}
-coinflips = {}  # {id: {"creator": user_id, "amount": int, "time": float}}
+coinflips = {}  # {id: {"creator": user_id, "creator_name": str, "amount": int, "time": float}}
+coinflip_ids = itertools.count(1)  # flips live only in memory, so ids need only be unique within this run
 EXPIRY_SECONDS = 1800
 
 @bot.tree.command(name="work", description="Work to earn coins!")
@@ -3008,7 +3188,7 @@ async def work(interaction: discord.Interaction):
     # Random reward
     reward = random.randint(2000, 8000)
     players[user_id]["coins"] += reward
-    await save_json(PLAYER_FILE, players)
+    mark_player_dirty(user_id)
 
     next_available = int(now + cooldown)
     await interaction.response.send_message(
@@ -3036,8 +3216,7 @@ async def ahsell(interaction: discord.Interaction, id: str, amount: int, price:
     p = players[user_id]
     bag = p.get("bag", {})
 
-    # Case-insensitive bag key lookup
-    matched_key = next((k for k in bag if k.lower() == id.lower()), None)
+    matched_key = bag.stored_name(id)
     if not matched_key:
         await interaction.response.send_message(f"❌ You don’t have any **{id}** in your bag.", ephemeral=True)
         return
@@ -3047,26 +3226,27 @@ async def ahsell(interaction: discord.Interaction, id: str, amount: int, price:
         return
 
     # Deduct from bag
-    bag[matched_key] -= amount
-    if bag[matched_key] <= 0:
-        del bag[matched_key]
+    bag_consume(bag, matched_key, amount)
 
     # Create auction
     auc_id = new_auction_id()
     end_time = datetime.now(timezone.utc) + timedelta(hours=time)
+    end_ts = end_time.timestamp()
     auctions[auc_id] = {
         "seller": user_id,
         "item": matched_key,  # Keep original case
         "amount": amount,
         "price": price,
-        "end_time": end_time.isoformat()
+        "end_time": end_time.isoformat(),
+        "end_ts": end_ts
     }
-    await save_json(AUCTION_FILE, auctions)
-    await save_json(PLAYER_FILE, players)
+    heapq.heappush(auction_expiry, (end_ts, auc_id))
+    mark_dirty(AUCTION_FILE)
+    mark_player_dirty(user_id)
 
     await interaction.response.send_message(
         f"✅ Listed {amount}x **{matched_key}** for 💰{price} each\n"
-        f"Auction ends <t:{int(end_time.timestamp())}:R>\n"
+        f"Auction ends <t:{int(end_ts)}:R>\n"
         f"Auction ID: `{auc_id}`",
         ephemeral=True)
 
@@ -3100,18 +3280,18 @@ async def ahbuy(interaction: discord.Interaction, id: str, amount: int = 1):
     # Pay seller
     seller_id = auction["seller"]
     if seller_id in players:
-        players[seller_id]["coins"] = players[seller_id].get("coins", 0) + total_cost
+        players[seller_id]["coins"] += total_cost
     
     # Give item(s)
-    buyer["bag"][auction["item"]] = buyer["bag"].get(auction["item"], 0) + amount
+    buyer["bag"][auction["item"]] += amount
     
     # Reduce auction amount
     auction["amount"] -= amount
     if auction["amount"] <= 0:
         del auctions[id]
     
-    await save_json(AUCTION_FILE, auctions)
-    await save_json(PLAYER_FILE, players)
+    mark_dirty(AUCTION_FILE)
+    mark_player_dirty(user_id, seller_id)
     
     await interaction.response.send_message(
         f"✅ Bought {amount}x **{auction['item']}** for 💰{total_cost}",
@@ -3138,24 +3318,36 @@ async def ahcancel(interaction: discord.Interaction, id: str):
         await interaction.response.send_message("⚠️ Create a profile first with `/profile`.", ephemeral=True)
         return
 
-    bag = p.setdefault("bag", {})
-
     # Return items to seller’s bag
     item_name = auc["item"]
     amount = auc["amount"]
-    bag[item_name] = bag.get(item_name, 0) + amount
+    p["bag"][item_name] += amount
 
     # Remove auction
     del auctions[id]
 
-    await save_json(AUCTION_FILE, auctions)
-    await save_json(PLAYER_FILE, players)
+    mark_dirty(AUCTION_FILE)
+    mark_player_dirty(user_id)
 
     await interaction.response.send_message(
         f"✅ Auction `{id}` canceled.\nReturned **{amount}x {item_name}** to your bag.",
         ephemeral=True
     )
 
+# Reel weights and payouts for /slots; 🎁 pays nothing itself but grants free spins
+SLOT_SYMBOLS = (
+    ("🍇",) * 8 +
+    ("🍒",) * 8 +
+    ("🍋",) * 6 +
+    ("⭐",) * 4 +
+    ("🔔",) * 6 +
+    ("💎",) * 2 +
+    ("🎁",) * 1)
+# One edit per frame, so keep it to a handful: every frame is a REST call against a ~5/s route limit
+SLOT_DELAYS = (0.15, 0.35, 0.75, 1.5)
+SLOT_TRIPLE_MULT = {"🍇": 4, "🍒": 4, "🍋": 4, "⭐": 15, "🔔": 10, "💎": 100}
+SLOT_PAIR_MULT = {"🍇": 0.5, "🍒": 0.5, "🍋": 0.5, "⭐": 3.5, "🔔": 2.5, "💎": 15}
+
 @bot.tree.command(name="slots", description="Gamble your coins in a slot machine!")
 @app_commands.describe(amount="Amount of coins to bet")
 async def slots(interaction: discord.Interaction, amount: int):
@@ -3169,16 +3361,8 @@ async def slots(interaction: discord.Interaction, amount: int):
         return
 
     players[user_id]["coins"] -= amount
-    await save_json(PLAYER_FILE, players)
-
-    symbols = (
-        ["🍇"] * 8 +
-        ["🍒"] * 8 +
-        ["🍋"] * 6 +
-        ["⭐"] * 4 +
-        ["🔔"] * 6 +
-        ["💎"] * 2 + 
-        ["🎁"] * 1)
+    mark_player_dirty(user_id)
+
     free_spins = 0
     total_winnings = 0
     spin_number = 1
@@ -3188,9 +3372,9 @@ async def slots(interaction: discord.Interaction, amount: int):
     msg = await interaction.original_response()
 
     while True:
-        delays = [0.05, 0.075, 0.1, 0.115, 0.135, 0.15, 0.2, 0.25, 0.35, 0.5, 0.75, 1.7]  
-        for delay in delays:
-            rows = [[random.choice(symbols) for _ in range(3)] for _ in range(3)]
+        for delay in SLOT_DELAYS:
+            reels = random.choices(SLOT_SYMBOLS, k=9)
+            rows = [reels[0:3], reels[3:6], reels[6:9]]
             display = ""
             for i, row in enumerate(rows):
                 line = " | ".join(row)
@@ -3203,47 +3387,22 @@ async def slots(interaction: discord.Interaction, amount: int):
                 description=f"```\n{display}```",
                 color=discord.Color.purple()
             )
-            await msg.edit(embed=embed, content=None)
-            await asyncio.sleep(delay)
+            # The delay runs alongside the edit's round-trip; frames stay in order since each awaits the last
+            await asyncio.gather(msg.edit(embed=embed, content=None), asyncio.sleep(delay))
 
+        # The last animation frame is the result; display already holds its rows
         middle = rows[1]
-        display = ""
-        for i, row in enumerate(rows):
-            line = " | ".join(row)
-            if i == 1:
-                display += f"   {line} ⬅️\n"
-            else:
-                display += f"   {line}\n"
-
-        payout = 0
-        if len(set(middle)) == 1:
-            symbol = middle[0]
-            if symbol in ["🍇", "🍒", "🍋"]:
-                payout = amount * 4
-            elif symbol == "⭐":
-                payout = amount * 15
-            elif symbol == "🔔":
-                payout = amount * 10
-            elif symbol == "💎":
-                payout = amount * 100
-
-        elif len(set(middle)) == 2:
-            for sym in middle:
-                if middle.count(sym) == 2:
-                    symbol = sym
-                    break
-            if symbol in ["🍇", "🍒", "🍋"]:
-                payout = int(amount * 0.5)
-            elif symbol == "⭐":
-                payout = int(amount * 3.5)
-            elif symbol == "🔔":
-                payout = int(amount * 2.5)
-            elif symbol == "💎":
-                payout = amount * 15
+        a, b, c = middle
+        if a == b == c:
+            payout = int(amount * SLOT_TRIPLE_MULT.get(a, 0))
+        elif a == b or a == c or b == c:
+            pair = b if b == c else a
+            payout = int(amount * SLOT_PAIR_MULT.get(pair, 0))
+        else:
+            payout = 0
 
         players[user_id]["coins"] += payout
         total_winnings += payout
-        await save_json(PLAYER_FILE, players)
 
         if bonus_mode:
             total_winnings += payout
@@ -3286,6 +3445,9 @@ async def slots(interaction: discord.Interaction, amount: int):
         else:
             break
 
+    # Payouts accumulate in memory across spins; the session is written once it ends
+    mark_player_dirty(user_id)
+
     # 🔹 Final bonus summary
     if bonus_mode and total_winnings > 0:
         embed = discord.Embed(
@@ -3315,12 +3477,12 @@ async def cfcreate(interaction: discord.Interaction, amount: int):
 
     # Deduct coins upfront
     p["coins"] -= amount
-    await save_json(PLAYER_FILE, players)
+    mark_player_dirty(user_id)
 
-    # Generate unique ID
-    cf_id = str(int(time.time() * 1000))[-6:]
+    cf_id = str(next(coinflip_ids))
     coinflips[cf_id] = {
         "creator": user_id,
+        "creator_name": p.get("username", "Unknown"),  # flips last 30 minutes, so the name won't go stale
         "amount": amount,
         "time": time.time()
     }
@@ -3338,12 +3500,16 @@ async def cf(interaction: discord.Interaction):
 
     lines = []
     now = time.time()
-    for cf_id, data in coinflips.items():
-        creator = players.get(data["creator"], {}).get("username", "Unknown")
-        uptime = timedelta(seconds=int(now - data["time"]))
-        remaining = EXPIRY_SECONDS - int(now - data["time"])
-        mins, secs = divmod(max(0, remaining), 60)
+    # Only rows that are shown get formatted; the embed description couldn't hold hundreds anyway
+    for cf_id, data in itertools.islice(coinflips.items(), 20):
+        creator = data["creator_name"]
+        elapsed = int(now - data["time"])
+        up_mins, up_secs = divmod(elapsed, 60)
+        uptime = f"{up_mins // 60}:{up_mins % 60:02}:{up_secs:02}"  # same H:MM:SS as str(timedelta)
+        mins, secs = divmod(max(0, EXPIRY_SECONDS - elapsed), 60)
         lines.append(f"🆔 `{cf_id}` | 💰 {data['amount']} coins | 👤 {creator} | ⏱️ {uptime} | ⌛ {mins:02}:{secs:02} left")
+    if len(coinflips) > 20:
+        lines.append(f"…and {len(coinflips) - 20} more")
 
     embed = discord.Embed(
         title="🎲 Active Coinflips",
@@ -3390,7 +3556,7 @@ async def cftake(interaction: discord.Interaction, id: str):
 
     # Remove flip
     del coinflips[id]
-    await save_json(PLAYER_FILE, players)
+    mark_player_dirty(user_id, creator_id)
 
     winner_name = players[winner]["username"]
     loser_name = players[loser]["username"]
@@ -3496,22 +3662,24 @@ async def help(interaction: discord.Interaction):
 
 @tasks.loop(minutes=1)
 async def auction_cleanup():
-    now = datetime.now(timezone.utc)
+    now = time.time()
     expired = []
-    for auc_id, auc in list(auctions.items()):
-        end_time = datetime.fromisoformat(auc["end_time"])
-        if now >= end_time:
-            seller_id = auc["seller"]
-            if auc["amount"] > 0 and seller_id in players:
-                players[seller_id]["bag"][auc["item"]] = players[seller_id]["bag"].get(auc["item"], 0) + auc["amount"]
-            expired.append(auc_id)
+    while auction_expiry and auction_expiry[0][0] <= now:
+        _, auc_id = heapq.heappop(auction_expiry)
+        auc = auctions.get(auc_id)
+        if auc is None or auction_end_ts(auc) > now:
+            continue
+        seller_id = auc["seller"]
+        if auc["amount"] > 0 and seller_id in players:
+            bag_add(players[seller_id]["bag"], auc["item"], auc["amount"])
+            mark_player_dirty(seller_id)
+        expired.append(auc_id)
     
     for auc_id in expired:
         del auctions[auc_id]
     
     if expired:
-        await save_json(AUCTION_FILE, auctions)
-        await save_json(PLAYER_FILE, players)
+        mark_dirty(AUCTION_FILE)
         print(f"🛒 Auction cleanup: expired {len(expired)} auctions.")
 
 @tasks.loop(minutes=1)
@@ -3528,7 +3696,8 @@ async def coinflip_cleanup():
 
             # Refund coins if creator still exists
             if creator_id in players:
-                players[creator_id]["coins"] = players[creator_id].get("coins", 0) + amount
+                players[creator_id]["coins"] += amount
+                mark_player_dirty(creator_id)
                 print(f"💸 Refunded {amount} coins to {players[creator_id]['username']} for expired coinflip {cf_id}")
 
             expired.append(cf_id)
@@ -3537,9 +3706,7 @@ async def coinflip_cleanup():
     for cf_id in expired:
         del coinflips[cf_id]
 
-    # Persist refunds
     if expired:
-        await save_json(PLAYER_FILE, players)
         print(f"🎲 Coinflip cleanup: expired {len(expired)} flips.")
 
 # -----------------------------
@@ -3550,6 +3717,8 @@ def main():
     if not TOKEN:
         print("❌ Set DISCORD_TOKEN environment variable.")
         return
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
     bot.run(TOKEN)
 
 if __name__ == "__main__":